@@ -9,8 +9,13 @@ Author: Schumi Development Team
 Date: 2024
 """
 
-from flask import Flask
+import gzip
+import zlib
+import click
+from flask import Flask, current_app, g, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 import os
 
 # Initialize extensions
@@ -36,24 +41,192 @@ def create_app(config_name='default'):
     from .config import Config
     app.config.from_object(Config)
     
+    # Use orjson for jsonify when installed (optional dependency)
+    from .utils import OrjsonJSONProvider
+    if OrjsonJSONProvider.is_available():
+        app.json = OrjsonJSONProvider(app)
+    
+    # Skip the per-dict key sort on every response (output is compact outside debug)
+    app.json.sort_keys = app.config.get('JSON_SORT_KEYS', False)
+    
+    # Create the upload directory once instead of on every saved CSV, and keep its
+    # path as a plain string attribute (read on every upload/delete)
+    app.upload_folder = os.fspath(app.config['UPLOAD_FOLDER'])
+    os.makedirs(app.upload_folder, exist_ok=True)
+    
     # Initialize extensions with app
     db.init_app(app)
     
+    # Warn about requests that issue too many SQL statements (N+1 guard)
+    if app.config.get('SQL_QUERY_WARN_THRESHOLD', 0) > 0:
+        _install_query_counter(app, app.config['SQL_QUERY_WARN_THRESHOLD'])
+    
+    # Compress repetitive JSON/HTML payloads
+    if app.config.get('COMPRESS_ENABLED', True):
+        _install_compression(app)
+    
     # Register blueprints/routes
     from .routes import main_bp
     app.register_blueprint(main_bp)
     
-    # Create database tables within application context
-    with app.app_context():
-        db.create_all()
+    # Compile every Jinja template at startup (outside debug, where templates
+    # auto-reload) so the first hit of each page skips parsing and compilation
+    if not app.debug:
+        for template_name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(template_name)
+    
+    # Register CLI command for one-off database initialization (flask init-db)
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create database tables, migrate legacy enum values and seed sample drivers if the database is empty."""
+        init_db()
+        # One-off data migration: kept out of init_db so workers do not rerun it on every start
+        _migrate_driver_enum_values()
+        print("Database initialized")
+    
+    # Bulk reclassification (e.g. a nightly job): one transaction for all drivers
+    @app.cli.command('classify-drivers')
+    @click.argument('driver_ids', nargs=-1, type=int)
+    def classify_drivers_command(driver_ids):
+        """Reclassify the given drivers (all drivers with a simulation file if none given)."""
+        from sqlalchemy import select
+        from .models import Driver
+        from .services import ClassificationService
         
-        # Initialize with sample data if database is empty
-        from .models import Driver, Classification, MonitoringStatus
-        if Driver.query.count() == 0:
-            _initialize_sample_data()
+        if not driver_ids:
+            driver_ids = db.session.scalars(
+                select(Driver.id).where(Driver.simulation_file.isnot(None))
+            ).all()
+        results = ClassificationService.classify_drivers(list(driver_ids))
+        print(f"Classified {len(results)} drivers")
+    
+    # Create database tables on startup only when enabled (disable in multi-worker
+    # deployments and run `flask init-db` once at deploy time instead)
+    if app.config.get('AUTO_INIT_DB', True):
+        with app.app_context():
+            init_db()
+    
+    # Warm up the emotion model in background so TensorFlow import/load
+    # does not slow down the first monitoring request
+    if app.config.get('EMOTION_PRELOAD_MODEL', True):
+        try:
+            from .ai.emotion_detector import preload_model
+            preload_model(app)
+        except ImportError as e:
+            app.logger.warning(f"AI module not available, model preload skipped: {e}")
     
     return app
 
+def _install_query_counter(app, threshold):
+    """
+    Count the SQL statements of each request and log a warning when a request
+    exceeds the threshold.
+    """
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.sql_query_count = g.get('sql_query_count', 0) + 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count)
+    
+    @app.after_request
+    def _warn_on_query_count(response):
+        count = g.get('sql_query_count', 0)
+        if count > threshold:
+            app.logger.warning(f"{request.method} {request.path} issued {count} SQL queries "
+                               f"(threshold {threshold})")
+        return response
+
+def _install_compression(app):
+    """
+    Gzip eligible responses when the client accepts it (stdlib gzip, no
+    extra dependency). Streamed responses are compressed chunk by chunk as
+    they are sent; file passthrough, already encoded and bodiless responses
+    are left untouched.
+    """
+    mimetypes = app.config['COMPRESS_MIMETYPES']
+    level = app.config['COMPRESS_LEVEL']
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    
+    @app.after_request
+    def _compress_response(response):
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in mimetypes or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.accept_encodings):
+            return response
+        
+        if response.is_streamed:
+            response.response = _gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            response.set_data(gzip.compress(body, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        # Same resource, different bytes: a strong validator must not be shared
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+def _gzip_stream(chunks, level):
+    """Gzip an iterable response body incrementally, without buffering it."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def init_db():
+    """
+    Create all database tables and insert sample data if the drivers table is empty.
+    
+    Must be called within an application context.
+    """
+    from .models import Driver, ClassificationResult
+    
+    db.create_all()
+    
+    # create_all skips tables that already exist: add indexes introduced later
+    for table in (Driver.__table__, ClassificationResult.__table__):
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except IntegrityError:
+                current_app.logger.warning(
+                    f"Index {index.name} not created: existing rows violate it (remove the duplicates and restart)")
+    
+    # Initialize with sample data if database is empty
+    if Driver.query.count() == 0:
+        _initialize_sample_data()
+
+def _migrate_driver_enum_values():
+    """
+    Rewrite driver classification/status stored by enum name (the former
+    Enum column type) as the enum value now used by the String columns.
+    """
+    from sqlalchemy import update
+    from .models import Driver, Classification, MonitoringStatus
+    
+    for column, enum_class in ((Driver.classification, Classification),
+                               (Driver.monitoring_status, MonitoringStatus)):
+        for member in enum_class:
+            db.session.execute(
+                update(Driver)
+                .where(column == member.name)
+                .values({column: member.value, Driver.updated_at: Driver.updated_at})
+            )
+    db.session.commit()
+
 def _initialize_sample_data():
     """
     Initialize the database with sample driver data for demonstration purposes.
@@ -0,0 +1,50 @@
+"""
+Conversione offline del modello di emotion detection in ONNX
+
+Questo script esporta il modello Keras in un file .onnx da eseguire con
+ONNX Runtime. Se il file viene salvato accanto al modello Keras (stesso nome,
+estensione .onnx) e onnxruntime è installato, viene preferito automaticamente.
+
+Usage:
+    python -m app.ai.convert_to_onnx --model app/ai/models/frank_emotion_detector_model.keras \\
+        --output app/ai/models/frank_emotion_detector_model.onnx
+
+Author: Schumi Development Team
+Date: 2024
+"""
+
+import argparse
+from pathlib import Path
+
+def convert(model_path, output_path, opset=13, nchw=False):
+    """
+    Converte il modello Keras in ONNX tramite tf2onnx.
+
+    Args:
+        model_path (str): Path del modello .keras
+        output_path (str): Path del file .onnx da generare
+        opset (int): Versione dell'opset ONNX
+        nchw (bool): Esporta l'input in layout channels-first (1, C, H, W)
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(str(model_path))
+    _, H, W, C = model.input_shape
+    signature = (tf.TensorSpec((None, H, W, C), tf.float32, name='input'),)
+
+    onnx_model, _ = tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset,
+                                               inputs_as_nchw=['input'] if nchw else None)
+    Path(output_path).write_bytes(onnx_model.SerializeToString())
+    print(f"Modello ONNX salvato in: {output_path}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converte il modello di emotion detection in ONNX')
+    parser.add_argument('--model', required=True, help='Path del modello .keras')
+    parser.add_argument('--output', required=True, help='Path del file .onnx di output')
+    parser.add_argument('--opset', type=int, default=13, help='Versione dell\'opset ONNX')
+    parser.add_argument('--nchw', action='store_true',
+                        help='Input channels-first (richiede EMOTION_MODEL_LAYOUT=NCHW)')
+    args = parser.parse_args()
+
+    convert(args.model, args.output, opset=args.opset, nchw=args.nchw)
@@ -0,0 +1,87 @@
+"""
+Conversione offline del modello di emotion detection in TFLite
+
+Questo script converte il modello Keras in un file .tflite con quantizzazione
+post-training int8, da usare impostando EMOTION_MODEL_PATH sul file generato.
+Il representative dataset viene costruito dalle immagini di volti presenti in
+una cartella (se fornita), altrimenti da tensori casuali nel range di input.
+
+Usage:
+    python -m app.ai.convert_to_tflite --model app/ai/models/frank_emotion_detector_model.keras \\
+        --output app/ai/models/frank_emotion_detector_model.tflite --faces data/faces --mode raw_bgr
+
+Author: Schumi Development Team
+Date: 2024
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+def _representative_dataset(faces_dir, input_shape, mode, samples=100):
+    """
+    Generatore di campioni per la calibrazione della quantizzazione.
+
+    Args:
+        faces_dir (Path | None): Cartella con immagini di volti già ritagliati
+        input_shape (tuple): Input shape del modello (None, H, W, C)
+        mode (str): Modalità di preprocessing ('rgb01' o 'raw_bgr')
+        samples (int): Numero massimo di campioni
+    """
+    _, H, W, C = input_shape
+    scale = 255.0 if mode == 'raw_bgr' else 1.0
+
+    images = []
+    if faces_dir is not None:
+        for path in sorted(Path(faces_dir).iterdir())[:samples]:
+            image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE if C == 1 else cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            image = cv2.resize(image, (W, H))
+            if C == 1:
+                image = image[..., np.newaxis]
+            elif mode != 'raw_bgr':
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            images.append(image.astype(np.float32) * (scale / 255.0))
+
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.uniform(0.0, scale, size=(H, W, C)).astype(np.float32) for _ in range(samples)]
+
+    for image in images:
+        yield [image[np.newaxis, ...]]
+
+def convert(model_path, output_path, faces_dir=None, mode='raw_bgr'):
+    """
+    Converte il modello Keras in TFLite con quantizzazione int8.
+
+    Args:
+        model_path (str): Path del modello .keras
+        output_path (str): Path del file .tflite da generare
+        faces_dir (str, optional): Cartella di volti per la calibrazione
+        mode (str): Modalità di preprocessing usata in produzione
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(str(model_path))
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: _representative_dataset(faces_dir, model.input_shape, mode)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    Path(output_path).write_bytes(tflite_model)
+    print(f"Modello TFLite salvato in: {output_path} ({len(tflite_model) / 1024:.1f} KB)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converte il modello di emotion detection in TFLite int8')
+    parser.add_argument('--model', required=True, help='Path del modello .keras')
+    parser.add_argument('--output', required=True, help='Path del file .tflite di output')
+    parser.add_argument('--faces', default=None, help='Cartella di volti per il representative dataset')
+    parser.add_argument('--mode', default='raw_bgr', choices=['raw_bgr', 'rgb01'],
+                        help='Modalità di preprocessing (deve coincidere con EMOTION_PREPROCESS_MODE)')
+    args = parser.parse_args()
+
+    convert(args.model, args.output, faces_dir=args.faces, mode=args.mode)
@@ -6,7 +6,7 @@ il modello Frank di emotion detection su frame catturati dalla webcam.
 
 Features:
 - Lazy loading del modello Keras e Haar Cascade
-- Rilevamento del volto più grande nell'immagine
+- Rilevamento del volto più grande nell'immagine (Haar Cascade o DNN YuNet opzionale)
 - Preprocessing adattivo (RGB/GRAY, input_shape, opzionale raw BGR come nel notebook)
 - Classificazione delle emozioni in 7 categorie
 - Mappatura delle emozioni a metriche stress/focus/calm
@@ -17,8 +17,13 @@ Date: 2024
 """
 
 import base64
+import logging
+import queue
 import time
 import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from typing import Dict, Optional, Tuple, Any
 import numpy as np
 import cv2
@@ -27,8 +32,29 @@ from pathlib import Path
 # Import TensorFlow with error handling per lazy loading
 _model = None
 _cascade = None
+_tf = None  # Modulo TensorFlow, importato lazy al caricamento del modello
+_predict_fn = None  # Concrete function compilata per l'inferenza (None -> chiamata eager del modello)
+_outputs_probs = False  # True se il modello restituisce già una distribuzione (testa softmax)
+_face_detector = None  # Face detector DNN YuNet (None -> Haar Cascade)
+_cascade_file = None  # File XML della cascade caricata, per crearne copie per le analisi concorrenti
+_face_detector_args = None  # Argomenti di cv2.FaceDetectorYN.create, idem
+_workspaces = queue.LifoQueue()  # Workspace (_Workspace) liberi, riutilizzati tra le richieste
 _model_lock = threading.Lock()
-_infer_lock = threading.Lock()  # Lock per serializzare face detection + inferenza
+# Logger del modulo: figlio del logger "app" di Flask, ne eredita handler e livello
+logger = logging.getLogger(__name__)
+_track_lock = threading.Lock()  # Lock sullo stato di tracking degli stream
+
+# Tracking del bbox tra una detection completa e l'altra, separato per stream (autista):
+# stream_id -> (bbox, shape del frame, indice del frame), in ordine LRU (protetto da _track_lock)
+_track_states = OrderedDict()
+_MIN_ROI_STD = 8.0  # Sotto questa deviazione standard la ROI è considerata "collassata"
+_ROI_FACE_SIDE = 64  # Lato (px) a cui viene ridotto il volto per la ricerca nella ROI
+_MAX_STREAMS = 256  # Stream di cui viene conservato lo stato (tracking, dedup); oltre, si scarta il meno recente
+
+# Ultimo risultato analizzato e hash percettivo del suo frame, separati per stream (autista):
+# stream_id -> (hash, risultato, istante), in ordine LRU (protetti da _dedup_lock)
+_dedup_lock = threading.Lock()
+_dedup_states = OrderedDict()
 
 # Etichette delle emozioni nell'ordine del training del modello
 EMOTION_LABELS = [
@@ -36,15 +62,40 @@ EMOTION_LABELS = [
     "Neutralita'", "Tristezza", "Sorpresa"
 ]
 
+# Pesi emozione -> metrica, colonne nell'ordine di EMOTION_LABELS, righe [stress, calm, focus]
+METRIC_WEIGHTS = np.array([
+    # Rabbia Disgusto Paura Felicita' Neutralita' Tristezza Sorpresa
+    [1.0,    0.9,     0.9,  0.0,      0.0,        0.5,      0.2],  # stress
+    [0.0,    0.0,     0.0,  0.8,      1.0,        0.0,      0.0],  # calm
+    [-0.5,   0.0,     -0.5, 0.5,      0.8,        0.0,      0.6],  # focus
+], dtype=np.float32)
+_METRIC_WEIGHTS_PCT = METRIC_WEIGHTS * np.float32(100.0)  # Pesi già scalati in punti percentuali
+
+# Lookup table uint8 -> float32 [0, 1] per la normalizzazione 'rgb01' (identica a x / 255.0)
+_NORM_LUT = np.arange(256, dtype=np.float32) / np.float32(255.0)
+
+# Flag di imdecode per la decodifica JPEG a risoluzione ridotta
+_IMREAD_REDUCTION_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+_MIN_REDUCE_WIDTH = 512  # Sotto questa larghezza il JPEG viene decodificato a piena risoluzione
+
+# Marker SOF (start of frame) JPEG che contengono le dimensioni dell'immagine
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
 def _load_model_and_cascade():
     """
-    Carica lazy il modello Keras e la Haar Cascade per il face detection.
+    Carica lazy il modello (Keras, TFLite o ONNX) e la Haar Cascade per il face detection.
     Con fallback automatico alla cascade built-in di OpenCV se il path custom fallisce.
     
     Returns:
         Tuple[Any, Any]: (model, cascade) o (None, None) se il caricamento fallisce
     """
-    global _model, _cascade
+    global _model, _cascade, _predict_fn, _face_detector, _tf, _outputs_probs
+    global _cascade_file
     
     # Doppio controllo con lock per thread safety
     if _model is not None and _cascade is not None:
@@ -55,10 +106,12 @@ def _load_model_and_cascade():
             return _model, _cascade
             
         try:
-            import tensorflow as tf
             from flask import current_app
             
-            cv2.setNumThreads(1)
+            # Thread interni di OpenCV per il detectMultiScale (parallel_for sulle stripe),
+            # condivisi tra le analisi concorrenti: ogni thread di richiesta esegue già la
+            # propria detection in parallelo, quindi di default resta 1
+            cv2.setNumThreads(int(current_app.config.get('OPENCV_NUM_THREADS', 1)))
             
             # Carica i path dalla configurazione
             model_path = Path(current_app.config['EMOTION_MODEL_PATH'])
@@ -66,105 +119,603 @@ def _load_model_and_cascade():
             
             # Verifica modello
             if not model_path.exists():
-                current_app.logger.warning(f"Modello di emotion detection non trovato: {model_path}")
+                logger.warning(f"Modello di emotion detection non trovato: {model_path}")
                 return None, None
             
-            # Carica Keras model
-            current_app.logger.info(f"Caricamento modello emotion detection: {model_path}")
-            _model = tf.keras.models.load_model(str(model_path))
-            current_app.logger.info("Modello caricato con successo")
+            # Se accanto al modello Keras c'è l'export ONNX (e onnxruntime è installato) lo preferisce
+            onnx_path = model_path.with_suffix('.onnx')
+            if model_path.suffix != '.onnx' and onnx_path.exists() and _onnxruntime_available():
+                model_path = onnx_path
+            
+            # Carica il modello: ONNX Runtime, TFLite (eventualmente quantizzato int8) o Keras
+            logger.info(f"Caricamento modello emotion detection: {model_path}")
+            if model_path.suffix == '.onnx':
+                num_threads = int(current_app.config.get('EMOTION_ORT_THREADS', 2))
+                model = _ONNXModel(model_path, num_threads=num_threads)
+                _predict_fn = None
+            else:
+                import tensorflow as tf
+                _tf = tf
+                device = _configure_gpus(tf, bool(current_app.config.get('EMOTION_USE_GPU', True)))
+                
+                if model_path.suffix == '.tflite':
+                    num_threads = int(current_app.config.get('EMOTION_TFLITE_THREADS', 2))
+                    model = _TFLiteModel(tf, model_path, num_threads=num_threads)
+                    _predict_fn = None
+                else:
+                    model = tf.keras.models.load_model(str(model_path))
+                    # XLA compila un grafo per ogni batch size: con il batching attivo
+                    # (batch da 1 a EMOTION_BATCH_MAX) resta il grafo TF non compilato
+                    jit_compile = int(current_app.config.get('EMOTION_BATCH_MAX', 1)) <= 1
+                    _predict_fn = _build_predict_fn(tf, model, device=device, jit_compile=jit_compile)
+            logger.info("Modello caricato con successo")
             
             # Carica Haar Cascade con fallback
             cascade_loaded = False
             if cascade_path.exists():
-                current_app.logger.info(f"Tentativo caricamento Haar Cascade custom: {cascade_path}")
+                logger.info(f"Tentativo caricamento Haar Cascade custom: {cascade_path}")
                 temp_cascade = cv2.CascadeClassifier(str(cascade_path))
                 if not temp_cascade.empty():
                     _cascade = temp_cascade
+                    _cascade_file = str(cascade_path)
                     cascade_loaded = True
-                    current_app.logger.info("Haar Cascade custom caricata con successo")
+                    logger.info("Haar Cascade custom caricata con successo")
                 else:
-                    current_app.logger.warning("Haar Cascade custom vuota, tentativo fallback")
+                    logger.warning("Haar Cascade custom vuota, tentativo fallback")
             else:
-                current_app.logger.warning(f"Haar Cascade custom non trovata: {cascade_path}")
+                logger.warning(f"Haar Cascade custom non trovata: {cascade_path}")
             
             if not cascade_loaded:
                 fallback_path = Path(cv2.data.haarcascades) / 'haarcascade_frontalface_default.xml'
-                current_app.logger.info(f"Tentativo fallback Haar Cascade built-in: {fallback_path}")
+                logger.info(f"Tentativo fallback Haar Cascade built-in: {fallback_path}")
                 temp_cascade = cv2.CascadeClassifier(str(fallback_path))
                 if not temp_cascade.empty():
                     _cascade = temp_cascade
+                    _cascade_file = str(fallback_path)
                     cascade_loaded = True
-                    current_app.logger.info("Haar Cascade built-in caricata con successo (fallback)")
+                    logger.info("Haar Cascade built-in caricata con successo (fallback)")
                 else:
-                    current_app.logger.error("Anche la Haar Cascade built-in è vuota")
+                    logger.error("Anche la Haar Cascade built-in è vuota")
             
             if not cascade_loaded:
-                current_app.logger.error("Errore nel caricamento di qualsiasi Haar Cascade")
+                logger.error("Errore nel caricamento di qualsiasi Haar Cascade")
                 return None, None
-                
+            
+            # Face detector DNN (YuNet) opzionale: se presente sostituisce la Haar Cascade
+            detector_path = current_app.config.get('FACE_DETECTOR_PATH')
+            if detector_path:
+                _face_detector = _load_face_detector(
+                    Path(detector_path),
+                    score_threshold=float(current_app.config.get('FACE_DETECTOR_SCORE_THRESHOLD', 0.6)),
+                    nms_threshold=float(current_app.config.get('FACE_DETECTOR_NMS_THRESHOLD', 0.3))
+                )
+            
+            # Primo workspace con gli oggetti appena caricati e i buffer già preallocati
+            layout = current_app.config.get('EMOTION_MODEL_LAYOUT', 'NHWC')
+            workspace = _Workspace(_cascade, _face_detector)
+            input_buf = workspace.input_buffer(*_input_hwc(model.input_shape, layout), layout=layout)
+            _workspaces.put(workspace)
+            
+            # Con una testa softmax la normalizzazione per frame può essere saltata
+            _outputs_probs = _model_outputs_probabilities(model, input_buf)
+            
+            # Il modello viene pubblicato per ultimo: il controllo senza lock all'inizio
+            # della funzione vede _model solo quando detector, workspace e _outputs_probs
+            # sono già pronti
+            _model = model
             return _model, _cascade
             
         except ImportError as e:
-            try:
-                from flask import current_app
-                current_app.logger.error(f"TensorFlow non disponibile: {e}")
-            except:
-                print(f"TensorFlow non disponibile: {e}")
+            logger.error(f"TensorFlow non disponibile: {e}")
             return None, None
         except Exception as e:
-            try:
-                from flask import current_app
-                current_app.logger.error(f"Errore nel caricamento del modello AI: {e}")
-            except:
-                print(f"Errore nel caricamento del modello AI: {e}")
+            logger.error(f"Errore nel caricamento del modello AI: {e}")
             return None, None
 
-def _decode_base64_image(image_data_url: str) -> Optional[np.ndarray]:
+def _load_face_detector(detector_path: Path, score_threshold: float = 0.6, nms_threshold: float = 0.3):
     """
-    Decodifica un'immagine da data URL base64 a array NumPy BGR.
+    Carica il face detector DNN YuNet (cv2.FaceDetectorYN) dal file ONNX.
+    
+    Returns:
+        cv2.FaceDetectorYN | None: detector o None se il modello non è disponibile
     """
+    if not detector_path.exists():
+        logger.info(f"Face detector YuNet non trovato, uso Haar Cascade: {detector_path}")
+        return None
+    if not hasattr(cv2, 'FaceDetectorYN'):
+        logger.warning("cv2.FaceDetectorYN non disponibile in questa versione di OpenCV")
+        return None
+    global _face_detector_args
+    
     try:
-        if image_data_url.startswith('data:image'):
-            _, encoded = image_data_url.split(',', 1)
-        else:
-            encoded = image_data_url
-            
-        image_bytes = base64.b64decode(encoded)
-        image_array = np.frombuffer(image_bytes, np.uint8)
-        image_bgr = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        return image_bgr
+        args = (str(detector_path), "", (320, 320), score_threshold, nms_threshold)
+        detector = cv2.FaceDetectorYN.create(*args)
+        _face_detector_args = args
+        logger.info(f"Face detector YuNet caricato: {detector_path}")
+        return detector
     except Exception as e:
-        try:
-            from flask import current_app
-            current_app.logger.error(f"Errore nella decodifica dell'immagine base64: {e}")
-        except:
-            print(f"Errore nella decodifica dell'immagine base64: {e}")
+        logger.warning(f"Errore nel caricamento del face detector YuNet, uso Haar Cascade: {e}")
         return None
 
-def _detect_largest_face(image_bgr: np.ndarray, cascade) -> Optional[Tuple[int, int, int, int]]:
+class _TFLiteModel:
+    """
+    Adattatore minimale attorno a tf.lite.Interpreter con la stessa interfaccia
+    usata dalla pipeline per i modelli Keras (input_shape e predict).
+    Gestisce in automatico quantizzazione/dequantizzazione per modelli int8.
+    """
+    
+    def __init__(self, tf, model_path: Path, num_threads: int = 1):
+        self._interpreter = tf.lite.Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        input_details = self._interpreter.get_input_details()[0]
+        output_details = self._interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in input_details['shape'][1:])
+        
+        # Indici e parametri di quantizzazione risolti una volta sola
+        self._in_idx = input_details['index']
+        self._out_idx = output_details['index']
+        self._in_dtype = input_details['dtype']
+        self._in_scale, self._in_zero = input_details['quantization']
+        self._out_scale, self._out_zero = output_details['quantization']
+        self._in_quantized = self._in_dtype in (np.int8, np.uint8) and bool(self._in_scale)
+        if self._in_quantized:
+            info = np.iinfo(self._in_dtype)
+            self._in_range = (info.min, info.max)
+        
+        # L'interprete TFLite non è thread-safe
+        self._lock = threading.Lock()
+    
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        # Quantizza l'intero batch in un colpo solo, poi invoca l'interprete per campione
+        if self._in_quantized:
+            batch = np.clip(np.round(batch / self._in_scale + self._in_zero), *self._in_range)
+        batch = batch.astype(self._in_dtype, copy=False)
+        
+        outputs = []
+        with self._lock:
+            for i in range(batch.shape[0]):
+                self._interpreter.set_tensor(self._in_idx, batch[i:i+1])
+                self._interpreter.invoke()
+                outputs.append(self._interpreter.get_tensor(self._out_idx)[0])
+        out = np.stack(outputs)
+        if self._out_scale:
+            out = (out.astype(np.float32) - self._out_zero) * self._out_scale
+        return out
+
+def _onnxruntime_available() -> bool:
+    """Verifica se onnxruntime è installato (dipendenza opzionale)."""
+    try:
+        import onnxruntime  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class _ONNXModel:
+    """
+    Adattatore attorno a onnxruntime.InferenceSession con la stessa interfaccia
+    dei modelli Keras (input_shape e predict). Usa il provider CPU con tutte le
+    ottimizzazioni di grafo abilitate.
+    """
+    
+    def __init__(self, model_path: Path, num_threads: int = 2):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        
+        model_input = self._session.get_inputs()[0]
+        self._in_name = model_input.name
+        self._out_name = self._session.get_outputs()[0].name
+        self.input_shape = (None,) + tuple(int(d) for d in model_input.shape[1:])
+    
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self._session.run([self._out_name], {self._in_name: batch.astype(np.float32, copy=False)})[0]
+
+def preload_model(app) -> None:
+    """
+    Carica modello e cascade in background all'avvio, così l'import di TensorFlow
+    non pesa sulla prima richiesta di analisi.
+    
+    Args:
+        app (Flask): Istanza dell'applicazione, necessaria per il contesto di configurazione
+    """
+    def _worker():
+        with app.app_context():
+            _load_model_and_cascade()
+    
+    threading.Thread(target=_worker, name='emotion-model-preload', daemon=True).start()
+
+def is_model_loaded() -> bool:
+    """
+    Indica se modello e cascade sono stati caricati e sono pronti per l'inferenza.
+    """
+    return _model is not None and _cascade is not None
+
+def _configure_gpus(tf, enabled: bool = True) -> str:
+    """
+    Abilita la memory growth sulle GPU disponibili (prima che TF le inizializzi)
+    e restituisce il device da usare per l'inferenza.
+    
+    Returns:
+        str: '/GPU:0' se una GPU è disponibile e abilitata, altrimenti '/CPU:0'
+    """
+    if not enabled:
+        return '/CPU:0'
+    try:
+        gpus = tf.config.list_physical_devices('GPU')
+        for gpu in gpus:
+            tf.config.experimental.set_memory_growth(gpu, True)
+    except Exception as e:
+        # RuntimeError se le GPU sono già state inizializzate: la configurazione resta quella attuale
+        logger.warning(f"Configurazione GPU non applicata: {e}")
+        gpus = tf.config.list_physical_devices('GPU')
+    if gpus:
+        logger.info(f"Inferenza emotion detection su GPU ({len(gpus)} disponibili)")
+        return '/GPU:0'
+    return '/CPU:0'
+
+def _build_predict_fn(tf, model, device: str = '/CPU:0', jit_compile: bool = True):
+    """
+    Costruisce una tf.function con input_signature fissa attorno al modello Keras,
+    evitando l'overhead di model.predict (data adapter, callback, retracing) ad ogni frame.
+    Il grafo viene eseguito sul device indicato (GPU se disponibile).
+    Viene conservata direttamente la concrete function, così ogni chiamata salta anche il
+    binding degli argomenti di tf.function; la funzione viene scaldata subito con un
+    tensore di zeri per pagare il tracing al caricamento.
+    Con jit_compile il grafo viene compilato da XLA per la forma del primo input: va
+    usato solo se il batch size è sempre 1, altrimenti ogni nuovo batch size ricompila.
+    
+    Se la compilazione XLA fallisce si riprova senza jit_compile.
+    
+    Returns:
+        Callable | None: funzione di inferenza o None se anche il grafo senza XLA fallisce
+    """
+    try:
+        _, H, W, C = model.input_shape
+        
+        def _predict(x):
+            with tf.device(device):
+                return model(x, training=False)
+        
+        predict_fn = tf.function(
+            _predict,
+            input_signature=[tf.TensorSpec(shape=(None, H, W, C), dtype=tf.float32)],
+            jit_compile=jit_compile
+        ).get_concrete_function()
+        predict_fn(tf.zeros((1, H, W, C), dtype=tf.float32))
+        logger.info("Funzione di inferenza tf.function compilata")
+        return predict_fn
+    except Exception as e:
+        if jit_compile:
+            # XLA può non supportare alcune op del modello: riprova senza jit_compile
+            logger.warning(f"Compilazione XLA fallita, riprovo senza jit_compile: {e}")
+            return _build_predict_fn(tf, model, device=device, jit_compile=False)
+        logger.warning(f"tf.function non disponibile, uso il modello Keras in eager: {e}")
+        return None
+
+def _model_outputs_probabilities(model, input_buf: np.ndarray) -> bool:
+    """
+    Verifica una volta sola, al caricamento, se il modello restituisce già probabilità:
+    ultimo layer Keras con attivazione softmax, oppure (TFLite/ONNX) un'inferenza di
+    warmup sul buffer di input che produce una distribuzione valida.
+    """
+    layers = getattr(model, 'layers', None)
+    if layers:
+        last = layers[-1]
+        activation = getattr(last, 'activation', None)
+        if getattr(activation, '__name__', '') == 'softmax' or type(last).__name__ == 'Softmax':
+            return True
+    try:
+        out = np.asarray(_run_inference(model, np.zeros_like(input_buf)), dtype=np.float32)[0]
+        # Tolleranza ampia per gli output dequantizzati dei modelli int8
+        return bool(out.min() >= -1e-6 and abs(float(out.sum()) - 1.0) <= 2e-2)
+    except Exception as e:
+        logger.warning(f"Impossibile verificare l'output del modello: {e}")
+        return False
+
+def _run_inference(model, face_input: np.ndarray) -> np.ndarray:
+    """
+    Esegue l'inferenza sul batch preprocessato tramite la tf.function cached,
+    con fallback alla chiamata diretta del modello Keras (o a predict per TFLite/ONNX).
+    Le concrete function TF e le sessioni ONNX Runtime sono thread-safe; l'adattatore
+    TFLite serializza internamente le chiamate all'interprete.
+    """
+    return _fetch_predictions(_dispatch_inference(model, face_input))
+
+def _dispatch_inference(model, face_input: np.ndarray):
+    """
+    Avvia l'inferenza e restituisce il risultato senza attenderlo: con la concrete function
+    su GPU l'EagerTensor restituito è asincrono e viene materializzato solo da
+    _fetch_predictions, così il chiamante può preparare il batch successivo nel frattempo.
+    """
+    if _predict_fn is not None:
+        return _predict_fn(_tf.constant(face_input, dtype=_tf.float32))
+    if _tf is not None and isinstance(model, _tf.keras.Model):
+        # Keras senza tf.function: chiamata diretta in eager, senza il data adapter di predict
+        return model(_tf.constant(face_input, dtype=_tf.float32), training=False)
+    return model.predict(face_input, verbose=0)
+
+def _fetch_predictions(result) -> np.ndarray:
+    """Attende e converte in array NumPy il risultato di _dispatch_inference."""
+    return result.numpy() if hasattr(result, 'numpy') else np.asarray(result)
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Legge (larghezza, altezza) dal marker SOF dell'header JPEG senza decodificare l'immagine.
+    
+    Returns:
+        Tuple[int, int] | None: dimensioni o None se i dati non sono un JPEG valido
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Byte di riempimento
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            # Marker senza payload
+            i += 2
+            continue
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return None
+
+def _decode_image_bytes(data, reduction: int = 1) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Decodifica i byte di un'immagine compressa (JPEG/PNG) in array NumPy BGR.
+    Con reduction 2/4/8 il JPEG viene decodificato direttamente da libjpeg
+    a 1/2, 1/4 o 1/8 della risoluzione originale; per JPEG più stretti di
+    _MIN_REDUCE_WIDTH (letti dall'header) la riduzione viene saltata.
+    
+    Returns:
+        Tuple: (immagine o None, fattore di riduzione effettivamente applicato)
+    """
+    try:
+        if reduction > 1:
+            size = _jpeg_size(data)
+            if size is not None and size[0] < _MIN_REDUCE_WIDTH:
+                reduction = 1
+        
+        flags = _IMREAD_REDUCTION_FLAGS.get(reduction, cv2.IMREAD_COLOR)
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flags), reduction
+    except Exception as e:
+        logger.error(f"Errore nella decodifica dell'immagine: {e}")
+        return None, reduction
+
+def _decode_base64_image(image_data_url: str, reduction: int = 1) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Decodifica un'immagine da data URL base64 a array NumPy BGR (vedi _decode_image_bytes).
+    
+    Returns:
+        Tuple: (immagine o None, fattore di riduzione effettivamente applicato)
+    """
+    try:
+        # Salta il prefisso "data:image/...;base64," con una memoryview sui byte ASCII: il payload
+        # viene copiato una sola volta (encode), non una seconda per lo slice
+        start = image_data_url.find(',') + 1 if image_data_url.startswith('data:image') else 0
+        encoded = memoryview(image_data_url.encode('ascii'))[start:]
+        data = base64.b64decode(encoded, validate=False)
+    except Exception as e:
+        logger.error(f"Errore nella decodifica dell'immagine base64: {e}")
+        return None, reduction
+    return _decode_image_bytes(data, reduction)
+
+def _detect_largest_face(image_bgr: np.ndarray, cascade, max_side: int = 320, scale_factor: float = 1.2,
+                         max_face_ratio: float = 0.75, face_detector=None,
+                         gray: Optional[np.ndarray] = None) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[np.ndarray]]:
     """
     Rileva il volto più grande nell'immagine usando Haar Cascade.
+    La detection gira su una copia grayscale ridotta (lato massimo max_side)
+    e il bbox viene riportato alle coordinate dell'immagine originale.
+    La piramide è limitata dall'alto con maxSize (max_face_ratio del lato corto):
+    i livelli per volti più grandi di quanto possa inquadrare la webcam vengono saltati.
+    Se viene passato un face_detector YuNet, la detection usa il DNN al posto della cascade.
+    L'immagine grayscale già calcolata per lo stesso frame può essere passata con gray.
+    
+    Returns:
+        Tuple: (bbox o None, immagine grayscale a piena risoluzione riutilizzabile nel preprocessing)
     """
+    if face_detector is not None:
+        return _detect_largest_face_dnn(image_bgr, face_detector, max_side), None
+    
     try:
-        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+        scale = max_side / float(max(gray.shape[:2]))
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small, scale = gray, 1.0
+        max_face = max(24, int(min(small.shape[:2]) * max_face_ratio))
+        faces = cascade.detectMultiScale(
+            small,
+            scaleFactor=scale_factor,
+            minNeighbors=4,
+            minSize=(24, 24),
+            maxSize=(max_face, max_face),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        if len(faces) == 0:
+            return None, gray
+        faces = np.asarray(faces)
+        largest_face = faces[(faces[:, 2] * faces[:, 3]).argmax()].tolist()
+        if scale == 1.0:
+            return tuple(largest_face), gray
+        return tuple(int(round(v / scale)) for v in largest_face), gray
+    except Exception as e:
+        logger.error(f"Errore nel face detection: {e}")
+        return None, gray
+
+def _detect_largest_face_dnn(image_bgr: np.ndarray, detector, max_side: int = 320) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Rileva il volto più grande (come il percorso Haar) usando il detector DNN YuNet
+    su una copia ridotta del frame (lato massimo max_side).
+    """
+    try:
+        h_img, w_img = image_bgr.shape[:2]
+        scale = max_side / float(max(h_img, w_img))
+        if scale < 1.0:
+            small = cv2.resize(image_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small, scale = image_bgr, 1.0
+        detector.setInputSize((small.shape[1], small.shape[0]))
+        _, faces = detector.detect(small)
+        if faces is None or len(faces) == 0:
+            return None
+        # Riga: x, y, w, h, 5 landmark (x, y), score (già filtrato da score_threshold)
+        best = faces[(faces[:, 2] * faces[:, 3]).argmax()]
+        x, y, w, h = (best[:4] / scale).tolist()
+        x0, y0 = max(0, int(round(x))), max(0, int(round(y)))
+        x1, y1 = min(w_img, int(round(x + w))), min(h_img, int(round(y + h)))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+    except Exception as e:
+        logger.error(f"Errore nel face detection DNN: {e}")
+        return None
+
+def _detect_face_in_roi(gray: np.ndarray, cascade, bbox: Tuple[int, int, int, int], pad: float = 0.3) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Ricerca il volto solo nell'intorno del bbox precedente (allargato di pad per lato),
+    con minSize/maxSize stretti attorno alla sua dimensione. La ROI viene ridotta in modo
+    che il volto misuri circa _ROI_FACE_SIDE px: pochi livelli di piramide su pochi pixel.
+    
+    Returns:
+        Tuple | None: bbox in coordinate dell'immagine o None se il volto non è più nella ROI
+    """
+    try:
+        h_img, w_img = gray.shape[:2]
+        x, y, w, h = bbox
+        pad_w, pad_h = int(w * pad), int(h * pad)
+        x0, y0 = max(0, x - pad_w), max(0, y - pad_h)
+        x1, y1 = min(w_img, x + w + pad_w), min(h_img, y + h + pad_h)
+        
+        roi_gray = gray[y0:y1, x0:x1]
+        side = max(w, h)
+        scale = min(1.0, _ROI_FACE_SIDE / float(side))
+        if scale < 1.0:
+            roi_gray = cv2.resize(roi_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        min_side = max(24, int(side * scale * 0.7))
+        max_side = max(min_side, int(side * scale * 1.3))
         faces = cascade.detectMultiScale(
-            gray,
+            roi_gray,
             scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
+            minNeighbors=4,
+            minSize=(min_side, min_side),
+            maxSize=(max_side, max_side)
         )
         if len(faces) == 0:
             return None
-        largest_face = max(faces, key=lambda face: face[2] * face[3])
-        return tuple(largest_face)
+        faces = np.asarray(faces)
+        fx, fy, fw, fh = faces[(faces[:, 2] * faces[:, 3]).argmax()].tolist()
+        return (x0 + int(round(fx / scale)), y0 + int(round(fy / scale)),
+                int(round(fw / scale)), int(round(fh / scale)))
     except Exception as e:
-        try:
-            from flask import current_app
-            current_app.logger.error(f"Errore nel face detection: {e}")
-        except:
-            print(f"Errore nel face detection: {e}")
+        logger.error(f"Errore nel face detection sulla ROI: {e}")
+        return None
+
+def _is_low_variance_frame(image_bgr: np.ndarray, min_std: float) -> bool:
+    """
+    Controllo rapido su una miniatura grayscale 160x120: un frame quasi uniforme
+    (buio, sovraesposto, in transizione) non contiene un volto analizzabile.
+    """
+    if min_std <= 0:
+        return False
+    small = cv2.resize(image_bgr, (160, 120), interpolation=cv2.INTER_AREA)
+    _, std = cv2.meanStdDev(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+    return float(std[0][0]) < min_std
+
+def _get_tracked_bbox(stream_id, image_bgr: np.ndarray, detect_every_n: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Restituisce il bbox dell'ultima detection dello stesso stream se può essere riutilizzato
+    sul frame corrente. Ritorna None quando serve una detection completa: senza stream_id,
+    ogni detect_every_n frame, al cambio di risoluzione o quando la ROI ha perso contrasto
+    (volto uscito dall'inquadratura).
+    """
+    if stream_id is None or detect_every_n <= 1:
+        return None
+    with _track_lock:
+        state = _track_states.get(stream_id)
+        if state is None:
+            return None
+        last_bbox, last_shape, frame_idx = state
+        _track_states[stream_id] = (last_bbox, last_shape, frame_idx + 1)
+    if last_bbox is None or frame_idx % detect_every_n == 0:
+        return None
+    if last_shape != image_bgr.shape:
         return None
+    
+    x, y, w, h = last_bbox
+    _, std = cv2.meanStdDev(image_bgr[y:y+h, x:x+w])
+    if float(std.mean()) < _MIN_ROI_STD:
+        return None
+    return last_bbox
+
+def _remember_bbox(stream_id, image_bgr: np.ndarray, bbox: Optional[Tuple[int, int, int, int]]) -> None:
+    """
+    Memorizza il bbox dell'ultima detection completa dello stream (None azzera il tracking).
+    """
+    if stream_id is None:
+        return
+    with _track_lock:
+        if bbox is None:
+            _track_states.pop(stream_id, None)
+            return
+        # La detection completa conta come frame 0: il prossimo riuso è al frame 1
+        state = _track_states.get(stream_id)
+        frame_idx = state[2] if state is not None else 1
+        _track_states[stream_id] = (bbox, image_bgr.shape, frame_idx)
+        _track_states.move_to_end(stream_id)
+        if len(_track_states) > _MAX_STREAMS:
+            _track_states.popitem(last=False)
+
+def _frame_hash(image_bgr: np.ndarray) -> int:
+    """
+    Average hash a 64 bit del frame: miniatura 8x8 in scala di grigi confrontata con la
+    sua media. La riduzione avviene prima della conversione, così si convertono 64 pixel.
+    """
+    small = cv2.cvtColor(cv2.resize(image_bgr, (8, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return int(np.packbits(small > small.mean()).view('>u8')[0])
+
+def _get_cached_result(stream_id, frame_hash: int, settings: Dict[str, Any], start_time: float) -> Optional[Dict[str, Any]]:
+    """
+    Restituisce una copia dell'ultimo risultato dello stesso stream se il frame è quasi
+    identico a quello analizzato (distanza di Hamming entro la soglia) e il risultato
+    non è scaduto. Anche i dizionari annidati (probs, bbox) vengono copiati, così le
+    risposte non condividono oggetti mutabili.
+    """
+    with _dedup_lock:
+        entry = _dedup_states.get(stream_id)
+    if entry is None:
+        return None
+    last_hash, last_result, last_time = entry
+    if (start_time - last_time >= settings['dedup_max_age']
+            or bin(frame_hash ^ last_hash).count('1') > settings['dedup_max_distance']):
+        return None
+    result = {key: dict(value) if isinstance(value, dict) else value for key, value in last_result.items()}
+    result['inferenceMs'] = round((time.time() - start_time) * 1000, 1)
+    return result
+
+def _remember_result(stream_id, frame_hash: int, result: Optional[Dict[str, Any]], start_time: float) -> None:
+    """Memorizza il risultato dell'ultima analisi completa dello stream per la deduplicazione."""
+    if result is None:
+        return
+    with _dedup_lock:
+        _dedup_states[stream_id] = (frame_hash, result, start_time)
+        _dedup_states.move_to_end(stream_id)
+        if len(_dedup_states) > _MAX_STREAMS:
+            _dedup_states.popitem(last=False)
 
 def _expand_bbox(image_shape, bbox, margin: float = 0.25, make_square: bool = True) -> Tuple[int, int, int, int]:
     """
@@ -173,6 +724,14 @@ def _expand_bbox(image_shape, bbox, margin: float = 0.25, make_square: bool = Tr
     """
     h_img, w_img = image_shape[:2]
     x, y, w, h = bbox
+    
+    if margin == 0.25 and make_square:
+        # Caso di default, solo aritmetica intera: lato = max(w, h) * 1.25, centrato sul volto
+        side = max(w + (w >> 2), h + (h >> 2))
+        x2 = max(0, x + ((w - side) >> 1))
+        y2 = max(0, y + ((h - side) >> 1))
+        return x2, y2, min(side, w_img - x2), min(side, h_img - y2)
+    
     cx = x + w / 2.0
     cy = y + h / 2.0
 
@@ -197,111 +756,165 @@ def _expand_bbox(image_shape, bbox, margin: float = 0.25, make_square: bool = Tr
 
     return x2, y2, w2, h2
 
-def _preprocess_face_image(image_bgr: np.ndarray, bbox: Tuple[int, int, int, int], input_shape: Tuple, mode: str = 'rgb01') -> Optional[np.ndarray]:
+def _input_hwc(input_shape, layout: str = 'NHWC') -> Tuple[int, int, int]:
+    """
+    Estrae (H, W, C) dall'input shape del modello (gestisce (None, H, W, C) o (H, W, C),
+    oppure (None, C, H, W) / (C, H, W) per i modelli channels-first con layout 'NCHW').
+    """
+    if isinstance(input_shape, (list, tuple)) and len(input_shape) in (3, 4):
+        dims = tuple(input_shape[-3:])
+        if layout == 'NCHW':
+            C, H, W = dims
+        else:
+            H, W, C = dims
+    else:
+        H, W, C = 224, 224, 3  # fallback
+    return H, W, C
+
+class _Workspace:
+    """
+    Risorse non rientranti di una singola analisi in corso: copie private di Haar Cascade
+    e YuNet (detectMultiScale e setInputSize/detect non sono thread-safe sullo stesso
+    oggetto) e buffer di preprocessing. Le analisi concorrenti usano workspace distinti,
+    presi in prestito da _workspaces.
+    """
+    
+    def __init__(self, cascade=None, face_detector=None):
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(_cascade_file) if _cascade_file else _cascade
+        if face_detector is None:
+            face_detector = cv2.FaceDetectorYN.create(*_face_detector_args) if _face_detector_args else _face_detector
+        self.cascade = cascade
+        self.face_detector = face_detector
+        self.input_buf = None   # Buffer di input (1, H, W, C) float32 riutilizzato tra i frame
+        self.resize_buf = None  # Tile uint8 (H, W[, C]) di destinazione del resize
+        self.bgr_buf = None     # Tile uint8 (H, W, 3) del crop BGR ridotto per i modelli gray
+    
+    def input_buffer(self, H: int, W: int, C: int, layout: str = 'NHWC') -> np.ndarray:
+        """
+        Restituisce il buffer float32 (1, H, W, C) - o (1, C, H, W) con layout 'NCHW' -
+        riutilizzato come input del modello.
+        Viene allocato una sola volta per input_shape, insieme ai tile uint8 intermedi
+        di resize e conversione colore.
+        """
+        shape = (1, C, H, W) if layout == 'NCHW' else (1, H, W, C)
+        if self.input_buf is None or self.input_buf.shape != shape:
+            self.input_buf = np.empty(shape, dtype=np.float32)
+            self.resize_buf = np.empty((H, W) if C == 1 else (H, W, C), dtype=np.uint8)
+            self.bgr_buf = np.empty((H, W, 3), dtype=np.uint8) if C == 1 else None
+        return self.input_buf
+
+@contextmanager
+def _borrow_workspace():
+    """Prende in prestito un workspace libero (creandone uno nuovo se sono tutti in uso)."""
+    try:
+        workspace = _workspaces.get_nowait()
+    except queue.Empty:
+        workspace = _Workspace()
+    try:
+        yield workspace
+    finally:
+        _workspaces.put(workspace)
+
+def _preprocess_face_image(image_bgr: np.ndarray, bbox: Tuple[int, int, int, int], input_shape: Tuple, workspace: _Workspace, mode: str = 'rgb01', gray: Optional[np.ndarray] = None, layout: str = 'NHWC') -> Optional[np.ndarray]:
     """
     Preprocessa il volto in base alla input_shape del modello e alla modalità.
     mode:
       - 'rgb01'   -> BGR->RGB + normalizzazione [0,1]
-      - 'raw_bgr' -> nessuna conversione colore, nessuna normalizzazione (BGR uint8)
+      - 'raw_bgr' -> nessuna conversione colore, nessuna normalizzazione (valori BGR 0..255)
     Supporta sia modelli RGB (HxWx3) sia grayscale (HxWx1).
+    Il resize avviene prima della conversione colore (sul tile piccolo) e la conversione
+    BGR->RGB è fusa nella normalizzazione: resize e normalizzazione scrivono nei buffer
+    preallocati del workspace e il batch (1, H, W, C)
+    restituito è il suo buffer di input, valido finché il workspace resta in prestito.
+    Per i modelli grayscale, se disponibile, viene ritagliata direttamente l'immagine gray
+    già calcolata dalla face detection.
+    Con layout 'NCHW' il tile viene trasposto mentre viene scritto nel buffer (1, C, H, W).
     """
     try:
-        # Determina H, W, C dall'input shape (gestisce (None, H, W, C) o (H, W, C))
-        shape = input_shape
-        if isinstance(shape, (list, tuple)) and len(shape) == 4:
-            _, H, W, C = shape
-        elif isinstance(shape, (list, tuple)) and len(shape) == 3:
-            H, W, C = shape
-        else:
-            H, W, C = 224, 224, 3  # fallback
+        H, W, C = _input_hwc(input_shape, layout)
+        channels_first = layout == 'NCHW'
 
         x, y, w, h = bbox
         face_bgr = image_bgr[y:y+h, x:x+w]
+        face_batch = workspace.input_buffer(H, W, C, layout=layout)
 
         if C == 1:
             # Modello grayscale
-            face_gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
-            face_resized = cv2.resize(face_gray, (W, H))
-            if mode == 'raw_bgr':
-                # Mantieni uint8, aggiungi canale
-                face_resized = np.expand_dims(face_resized, axis=-1)  # H, W, 1
+            if gray is not None:
+                face_resized = cv2.resize(gray[y:y+h, x:x+w], (W, H), dst=workspace.resize_buf)
             else:
-                face_resized = face_resized.astype(np.float32) / 255.0
-                face_resized = np.expand_dims(face_resized, axis=-1)
+                # Frame tracciato (nessuna gray dalla detection): resize del crop BGR nel tile
+                # a 3 canali, poi conversione gray sul tile ridotto, senza allocare il crop gray
+                face_small = cv2.resize(face_bgr, (W, H), dst=workspace.bgr_buf)
+                face_resized = cv2.cvtColor(face_small, cv2.COLOR_BGR2GRAY, dst=workspace.resize_buf)
+            out = face_batch[0, 0] if channels_first else face_batch[0, :, :, 0]
         else:
-            # Modello a 3 canali
-            if mode == 'raw_bgr':
-                # Nessuna conversione, nessuna normalizzazione
-                face_resized = cv2.resize(face_bgr, (W, H))  # BGR uint8
-            else:
-                # Pipeline standard: BGR->RGB + [0,1]
-                face_rgb = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB)
-                face_resized = cv2.resize(face_rgb, (W, H))
-                face_resized = face_resized.astype(np.float32) / 255.0
+            # Modello a 3 canali: resize sul crop; BGR->RGB è una vista con i canali invertiti,
+            # applicata dalla stessa passata che normalizza e scrive nel buffer di input
+            face_resized = cv2.resize(face_bgr, (W, H), dst=workspace.resize_buf)
+            if mode != 'raw_bgr':
+                face_resized = face_resized[:, :, ::-1]
+            if channels_first:
+                face_resized = face_resized.transpose(2, 0, 1)
+            out = face_batch[0]
+
+        if mode == 'raw_bgr':
+            # Nessuna normalizzazione: copia dei valori 0..255
+            np.copyto(out, face_resized)
+        else:
+            # Un'unica lettura indicizzata per pixel; mode='clip' evita il buffering di out
+            np.take(_NORM_LUT, face_resized, out=out, mode='clip')
 
-        face_batch = np.expand_dims(face_resized, axis=0)
         return face_batch
     except Exception as e:
-        try:
-            from flask import current_app
-            current_app.logger.error(f"Errore nel preprocessing del volto: {e}")
-        except:
-            print(f"Errore nel preprocessing del volto: {e}")
+        logger.error(f"Errore nel preprocessing del volto: {e}")
         return None
 
-def _to_probabilities(predictions: np.ndarray) -> Optional[np.ndarray]:
+def _to_probabilities(predictions: np.ndarray, in_place: bool = False, is_distribution: bool = False) -> Optional[np.ndarray]:
     """
     Converte l'output del modello in probabilità.
+    - Con is_distribution=True (testa softmax verificata al caricamento) lo restituisce senza controlli.
     - Se già in [0..1] e somma ~1, lo restituisce.
     - Altrimenti applica softmax numericamente stabile.
+    Con in_place=True il softmax viene calcolato direttamente nel buffer delle
+    predizioni (se float32 e scrivibile), senza allocare array temporanei.
     """
     try:
         arr = predictions[0] if predictions.ndim == 2 else predictions
-        arr = np.asarray(arr).astype(np.float64)
+        arr = np.asarray(arr, dtype=np.float32)
+        if is_distribution:
+            return arr
 
-        if np.all(np.isfinite(arr)) and np.all(arr >= -1e-6) and np.isclose(np.sum(arr), 1.0, atol=1e-3):
+        # Già una distribuzione (NaN/inf falliscono il confronto e vanno al softmax)
+        if arr.min() >= -1e-6 and abs(float(arr.sum()) - 1.0) <= 1e-3:
             return arr
 
-        # Softmax stabile
-        arr_shift = arr - np.max(arr)
-        exp = np.exp(arr_shift)
-        denom = np.sum(exp)
+        # Softmax stabile in float32
+        if in_place and arr.flags.writeable and np.shares_memory(arr, predictions):
+            exp = arr
+            exp -= arr.max()
+        else:
+            exp = arr - arr.max()
+        np.exp(exp, out=exp)
+        denom = float(exp.sum())
         if denom <= 0 or not np.isfinite(denom):
-            return np.ones_like(arr) / max(1, arr.shape[0])
-        return exp / denom
+            return np.full_like(arr, 1.0 / max(1, arr.shape[0]))
+        exp /= denom
+        return exp
     except Exception:
         return None
 
-def _map_emotions_to_metrics(emotion_probs: Dict[str, float]) -> Dict[str, float]:
+def _map_emotions_to_metrics(probs_array: np.ndarray) -> Dict[str, float]:
     """
-    Mappa le probabilità delle emozioni alle metriche stress/focus/calm.
+    Mappa le probabilità delle emozioni (array allineato a EMOTION_LABELS)
+    alle metriche stress/focus/calm con un singolo prodotto matrice-vettore.
     """
     try:
-        stress = (
-            emotion_probs.get("Rabbia", 0) * 1.0 +
-            emotion_probs.get("Disgusto", 0) * 0.9 +
-            emotion_probs.get("Paura", 0) * 0.9 +
-            emotion_probs.get("Tristezza", 0) * 0.5 +
-            emotion_probs.get("Sorpresa", 0) * 0.2
-        )
-        
-        calm = (
-            emotion_probs.get("Neutralita'", 0) * 1.0 +
-            emotion_probs.get("Felicita'", 0) * 0.8
-        )
-        
-        focus = (
-            emotion_probs.get("Neutralita'", 0) * 0.8 +
-            emotion_probs.get("Sorpresa", 0) * 0.6 +
-            emotion_probs.get("Felicita'", 0) * 0.5 -
-            emotion_probs.get("Paura", 0) * 0.5 -
-            emotion_probs.get("Rabbia", 0) * 0.5
-        )
+        metrics = _METRIC_WEIGHTS_PCT @ np.asarray(probs_array, dtype=np.float32)
         
-        # Clamp ai valori 0-100 e arrotonda a 0.1
-        stress = max(0.0, min(100.0, stress * 100))
-        calm = max(0.0, min(100.0, calm * 100))
-        focus = max(0.0, min(100.0, focus * 100))
+        # Clamp ai valori 0-100 (in place sul risultato del prodotto) e arrotonda a 0.1
+        stress, calm, focus = np.clip(metrics, 0.0, 100.0, out=metrics).tolist()
         
         return {
             'stress': round(stress, 1),
@@ -310,11 +923,7 @@ def _map_emotions_to_metrics(emotion_probs: Dict[str, float]) -> Dict[str, float
         }
         
     except Exception as e:
-        try:
-            from flask import current_app
-            current_app.logger.error(f"Errore nella mappatura delle metriche: {e}")
-        except:
-            print(f"Errore nella mappatura delle metriche: {e}")
+        logger.error(f"Errore nella mappatura delle metriche: {e}")
         # Valori neutrali di fallback
         return {'stress': 25.0, 'calm': 50.0, 'focus': 50.0}
 
@@ -332,89 +941,311 @@ def _get_neutral_emotion_data() -> Dict[str, Any]:
         'bbox': None
     }
 
-def analyze_frame(image_data_url: str) -> Optional[Dict[str, Any]]:
+def _read_settings() -> Dict[str, Any]:
     """
-    Analizza un frame dall'immagine base64 e restituisce i dati emotivi.
+    Legge dalla configurazione dell'app i parametri della pipeline di analisi.
+    Va chiamata nel contesto dell'app; il dizionario risultante può essere
+    passato ai worker della pipeline che girano fuori dal contesto Flask.
+    """
+    from flask import current_app
+    
+    config = current_app.config
+    reduction = int(config.get('EMOTION_DECODE_REDUCTION', 1))
+    return {
+        'reduction': reduction if reduction in _IMREAD_REDUCTION_FLAGS else 1,
+        'detect_every_n': int(config.get('EMOTION_DETECT_EVERY_N', 1)),
+        'roi_detect': bool(config.get('EMOTION_TRACK_ROI_DETECT', False)),
+        'max_side': int(config.get('FACE_DETECT_MAX_SIDE', 320)),
+        'scale_factor': float(config.get('FACE_DETECT_SCALE_FACTOR', 1.2)),
+        'max_face_ratio': float(config.get('FACE_DETECT_MAX_FACE_RATIO', 0.75)),
+        'mode': config.get('EMOTION_PREPROCESS_MODE', 'rgb01'),
+        'layout': config.get('EMOTION_MODEL_LAYOUT', 'NHWC'),
+        'min_std': float(config.get('EMOTION_MIN_STD', 0)),
+        'queue_size': int(config.get('EMOTION_PIPELINE_QUEUE_SIZE', 2)),
+        'batch_max': max(1, int(config.get('EMOTION_BATCH_MAX', 1))),
+        'batch_wait': float(config.get('EMOTION_BATCH_WAIT_MS', 0)) / 1000.0,
+        'batch_timeout': float(config.get('EMOTION_BATCH_TIMEOUT_MS', 1000)) / 1000.0,
+        'dedup_max_distance': int(config.get('EMOTION_DEDUP_MAX_DISTANCE', 0)),
+        'dedup_max_age': float(config.get('EMOTION_DEDUP_MAX_AGE_MS', 0)) / 1000.0
+    }
+
+def _locate_and_preprocess(image_bgr: np.ndarray, model, workspace: _Workspace, settings: Dict[str, Any],
+                           stream_id=None):
     """
-    start_time = time.time()
+    Individua il volto (tracking sullo stream stream_id o detection completa) e prepara
+    l'input del modello usando detector e buffer del workspace.
     
+    Returns:
+        Tuple: (face_input, bbox espanso) oppure (None, None) se nessun volto è rilevato;
+        face_input è None anche se il preprocessing fallisce
+    """
+    # Riusa il bbox precedente tra una detection completa e l'altra
+    face_bbox = _get_tracked_bbox(stream_id, image_bgr, settings['detect_every_n'])
+    
+    # La conversione grayscale del frame viene fatta una volta sola e condivisa tra ricerca
+    # nella ROI, detection completa e preprocessing dei modelli gray
+    gray = None
+    if face_bbox is not None and settings['roi_detect'] and workspace.face_detector is None:
+        # Rilocalizza il volto nell'intorno del bbox precedente per seguirne i movimenti
+        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+        face_bbox = _detect_face_in_roi(gray, workspace.cascade, face_bbox)
+        if face_bbox is not None:
+            _remember_bbox(stream_id, image_bgr, face_bbox)
+    if face_bbox is None:
+        face_bbox, gray = _detect_largest_face(image_bgr, workspace.cascade, max_side=settings['max_side'],
+                                               scale_factor=settings['scale_factor'],
+                                               max_face_ratio=settings['max_face_ratio'],
+                                               face_detector=workspace.face_detector, gray=gray)
+        _remember_bbox(stream_id, image_bgr, face_bbox)
+    if face_bbox is None:
+        return None, None
+    
+    # Espandi bbox per maggiore stabilità e contesto
+    expanded = _expand_bbox(image_bgr.shape, face_bbox, margin=0.25, make_square=True)
+    
+    # Preprocess: adatta alla input_shape del modello secondo la modalità configurata
+    input_shape = getattr(model, 'input_shape', (None, 224, 224, 3))
+    face_input = _preprocess_face_image(image_bgr, expanded, input_shape, workspace, mode=settings['mode'],
+                                        gray=gray, layout=settings['layout'])
+    return face_input, expanded
+
+def _neutral_result(start_time: float) -> Dict[str, Any]:
+    """Payload neutrale (nessun volto) con il tempo di elaborazione trascorso."""
+    neutral_data = _get_neutral_emotion_data()
+    neutral_data['inferenceMs'] = round((time.time() - start_time) * 1000, 1)
+    return neutral_data
+
+def _build_result(predictions: np.ndarray, expanded_bbox, reduction: int, start_time: float) -> Optional[Dict[str, Any]]:
+    """
+    Converte l'output del modello nel payload restituito al client.
+    """
+    # Probabilità robuste
+    # L'output del modello è di nostra proprietà: il softmax può lavorare in place
+    probs_array = _to_probabilities(predictions, in_place=True, is_distribution=_outputs_probs)
+    if probs_array is None or probs_array.shape[0] != len(EMOTION_LABELS):
+        logger.error(f"Dimensione output modello non valida: {predictions.shape}")
+        return None
+    
+    # Trova l'emozione dominante direttamente sull'array
+    top_emotion = EMOTION_LABELS[int(probs_array.argmax())]
+        
+    # Converti in dizionario per il payload JSON (tolist converte in float Python in un solo passaggio C)
+    emotion_probs = dict(zip(EMOTION_LABELS, probs_array.tolist()))
+    
+    # Prepara il bounding box (quello espanso) riportato alla risoluzione originale del frame
+    x2, y2, w2, h2 = expanded_bbox
+    bbox = {
+        'x': int(x2) * reduction,
+        'y': int(y2) * reduction,
+        'w': int(w2) * reduction,
+        'h': int(h2) * reduction
+    }
+    
+    # Tempo totale
+    total_inference_time = round((time.time() - start_time) * 1000, 1)
+    
+    return {
+        'emotion': top_emotion,
+        'probs': emotion_probs,
+        'inferenceMs': total_inference_time,
+        'bbox': bbox
+    }
+
+def analyze_frame(image_data_url: str, stream_id=None) -> Optional[Dict[str, Any]]:
+    """
+    Analizza un frame dall'immagine base64 e restituisce i dati emotivi.
+    stream_id identifica la sorgente dei frame (es. l'ID dell'autista): tracking
+    del volto e deduplicazione dei frame quasi identici usano solo frame dello
+    stesso stream e senza stream_id vengono saltati.
+    """
+    return _analyze(image_data_url, None, time.time(), stream_id)
+
+def analyze_frame_bytes(frame_bytes: bytes, stream_id=None) -> Optional[Dict[str, Any]]:
+    """
+    Analizza un frame ricevuto come byte JPEG/PNG grezzi (senza data URL base64)
+    e restituisce gli stessi dati emotivi di analyze_frame.
+    """
+    return _analyze(None, frame_bytes, time.time(), stream_id)
+
+def _infer_batched(face_input: np.ndarray, expanded, model, settings: Dict[str, Any],
+                   start_time: float) -> Optional[Dict[str, Any]]:
+    """
+    Accoda il volto al thread di inferenza in batch e ne attende il risultato, al più
+    batch_timeout secondi sia per entrare in coda sia per la risposta. Se la coda resta
+    piena o il thread non risponde (bloccato o terminato) l'inferenza viene eseguita
+    direttamente nel thread della richiesta, così la richiesta non resta appesa.
+    """
+    future = Future()
+    try:
+        infer_q = _start_pipeline(settings)
+        infer_q.put((future, face_input, expanded, model, settings, start_time), timeout=settings['batch_timeout'])
+        return future.result(timeout=settings['batch_timeout'])
+    except (queue.Full, FutureTimeoutError):
+        # Il future cancellato viene ignorato da _complete se il batch arriva in ritardo
+        future.cancel()
+        logger.warning("Inferenza in batch non disponibile, eseguo l'inferenza direttamente")
+    predictions = _run_inference(model, face_input)
+    return _build_result(predictions, expanded, settings['reduction'], start_time)
+
+def _analyze(image_data_url: Optional[str], frame_bytes: Optional[bytes], start_time: float,
+             stream_id=None) -> Optional[Dict[str, Any]]:
+    """
+    Percorso comune di analyze_frame / analyze_frame_bytes: il frame arriva
+    come data URL base64 oppure come byte già decodificati.
+    """
     try:
-        from flask import current_app
+        settings = _read_settings()
 
         # Carica modello e cascade
         model, cascade = _load_model_and_cascade()
         if model is None or cascade is None:
             return None
             
-        # Decodifica l'immagine base64
-        image_bgr = _decode_base64_image(image_data_url)
+        # Decodifica l'immagine (eventualmente a risoluzione ridotta)
+        if frame_bytes is not None:
+            image_bgr, reduction = _decode_image_bytes(frame_bytes, reduction=settings['reduction'])
+        else:
+            image_bgr, reduction = _decode_base64_image(image_data_url, reduction=settings['reduction'])
         if image_bgr is None:
             return None
+        if reduction != settings['reduction']:
+            settings = dict(settings, reduction=reduction)
+        
+        # Frame uniforme/buio: salta detection e inferenza
+        if _is_low_variance_frame(image_bgr, settings['min_std']):
+            return _neutral_result(start_time)
+        
+        # Frame quasi identico all'ultimo analizzato dello stesso stream (autista fermo): riusa il risultato
+        frame_hash = None
+        if settings['dedup_max_age'] > 0 and stream_id is not None:
+            frame_hash = _frame_hash(image_bgr)
+            cached = _get_cached_result(stream_id, frame_hash, settings, start_time)
+            if cached is not None:
+                return cached
             
-        # Serializza face detection + inferenza con lock per evitare race conditions
-        with _infer_lock:
-            # Rileva il volto più grande
-            face_bbox = _detect_largest_face(image_bgr, cascade)
-            if face_bbox is None:
+        # Detector e buffer privati per questa richiesta: le analisi concorrenti non si serializzano
+        with _borrow_workspace() as workspace:
+            face_input, expanded = _locate_and_preprocess(image_bgr, model, workspace, settings, stream_id)
+            if expanded is None:
                 # Nessun volto rilevato, restituisci valori neutrali
-                neutral_data = _get_neutral_emotion_data()
-                neutral_data['inferenceMs'] = round((time.time() - start_time) * 1000, 1)
-                return neutral_data
-
-            # Espandi bbox per maggiore stabilità e contesto
-            x2, y2, w2, h2 = _expand_bbox(image_bgr.shape, face_bbox, margin=0.25, make_square=True)
-
-            # Preprocess: leggi la modalità dalla config e adatta a input_shape
-            mode = current_app.config.get('EMOTION_PREPROCESS_MODE', 'rgb01')
-            input_shape = getattr(model, 'input_shape', (None, 224, 224, 3))
-            face_input = _preprocess_face_image(image_bgr, (x2, y2, w2, h2), input_shape, mode=mode)
-            if face_input is None:
+                result = _neutral_result(start_time)
+            elif face_input is None:
                 return None
-                
-            # Inferenza
-            predictions = model.predict(face_input, verbose=0)
-        
-        # Probabilità robuste
-        probs_array = _to_probabilities(predictions)
-        if probs_array is None or probs_array.shape[0] != len(EMOTION_LABELS):
-            try:
-                current_app.logger.error(f"Dimensione output modello non valida: {predictions.shape}")
-            except:
-                print(f"Dimensione output modello non valida: {predictions.shape}")
-            return None
-            
-        # Converti in dizionario
-        emotion_probs = {label: float(prob) for label, prob in zip(EMOTION_LABELS, probs_array)}
-        
-        # Trova l'emozione dominante
-        top_emotion = max(emotion_probs, key=emotion_probs.get)
-        
-        # Prepara il bounding box (quello espanso)
-        bbox = {'x': int(x2), 'y': int(y2), 'w': int(w2), 'h': int(h2)}
-        
-        # Tempo totale
-        total_inference_time = round((time.time() - start_time) * 1000, 1)
+            elif settings['batch_max'] == 1:
+                # Inferenza diretta, senza batching
+                predictions = _run_inference(model, face_input)
+                result = _build_result(predictions, expanded, settings['reduction'], start_time)
+            else:
+                # Inferenza in batch con i volti delle altre richieste concorrenti; il buffer
+                # del workspace resta valido perché il prestito dura fino al risultato
+                result = _infer_batched(face_input, expanded, model, settings, start_time)
         
-        return {
-            'emotion': top_emotion,
-            'probs': emotion_probs,
-            'inferenceMs': total_inference_time,
-            'bbox': bbox
-        }
+        if frame_hash is not None:
+            _remember_result(stream_id, frame_hash, result, start_time)
+        return result
         
     except Exception as e:
-        try:
-            from flask import current_app
-            current_app.logger.error(f"Errore nell'analisi del frame: {e}")
-        except:
-            print(f"Errore nell'analisi del frame: {e}")
+        logger.error(f"Errore nell'analisi del frame: {e}")
         return None
 
+# ================================
+# PIPELINE DI INFERENZA IN BATCH
+# ================================
+#
+# Con EMOTION_BATCH_MAX > 1 i thread delle richieste eseguono decode, detect e
+# preprocess in parallelo e accodano il volto (_infer_batched): un unico thread
+# raggruppa in un batch i volti in coda e risolve i future delle richieste.
+
+_pipeline_queue = None
+_pipeline_lock = threading.Lock()
+
+def _complete(future: Future, result: Optional[Dict[str, Any]]) -> None:
+    """Risolve il future se non è già stato risolto o cancellato."""
+    if not future.done():
+        try:
+            future.set_result(result)
+        except Exception:
+            pass
+
+def _collect_batch(in_queue: queue.Queue, batch_max: int, batch_wait: float) -> list:
+    """
+    Attende il primo volto, poi raccoglie quelli che arrivano entro batch_wait secondi
+    fino a un massimo di batch_max elementi.
+    """
+    items = [in_queue.get()]
+    deadline = time.monotonic() + batch_wait
+    while len(items) < batch_max:
+        timeout = deadline - time.monotonic()
+        try:
+            items.append(in_queue.get(timeout=timeout) if timeout > 0 else in_queue.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+def _finish_batch(items: list, result) -> None:
+    """Materializza le predizioni di un batch e risolve il future di ogni volto."""
+    try:
+        predictions = _fetch_predictions(result)
+    except Exception as e:
+        logger.error(f"Errore nello stadio di inferenza: {e}")
+        for item in items:
+            _complete(item[0], None)
+        return
+    
+    for (future, _, expanded, _, settings, start_time), row in zip(items, predictions):
+        try:
+            _complete(future, _build_result(row[np.newaxis], expanded, settings['reduction'], start_time))
+        except Exception as e:
+            logger.error(f"Errore nel postprocessing del batch: {e}")
+            _complete(future, None)
+
+def _inference_stage(in_queue: queue.Queue, batch_max: int, batch_wait: float) -> None:
+    # Doppio buffer: mentre il device calcola il batch avviato, il thread raccoglie e
+    # carica il successivo; il batch in sospeso viene chiuso appena la coda è vuota
+    pending = None
+    while True:
+        if pending is not None and in_queue.empty():
+            _finish_batch(*pending)
+            pending = None
+        
+        items = _collect_batch(in_queue, batch_max, batch_wait)
+        try:
+            # Un'unica chiamata al modello per tutti i volti raccolti
+            model = items[0][3]
+            batch = np.concatenate([item[1] for item in items], axis=0)
+            result = _dispatch_inference(model, batch)
+        except Exception as e:
+            logger.error(f"Errore nello stadio di inferenza: {e}")
+            for item in items:
+                _complete(item[0], None)
+            continue
+        
+        if pending is not None:
+            _finish_batch(*pending)
+        pending = (items, result)
+
+def _start_pipeline(settings: Dict[str, Any]) -> queue.Queue:
+    """
+    Avvia (una sola volta) il thread di inferenza in batch e ne restituisce la coda.
+    """
+    global _pipeline_queue
+    
+    with _pipeline_lock:
+        if _pipeline_queue is None:
+            infer_q = queue.Queue(maxsize=max(settings['queue_size'], settings['batch_max']))
+            threading.Thread(target=_inference_stage, args=(infer_q, settings['batch_max'], settings['batch_wait']),
+                             name='emotion-infer', daemon=True).start()
+            _pipeline_queue = infer_q
+    return _pipeline_queue
+
 def get_emotion_metrics(emotion_data: Dict[str, Any]) -> Dict[str, float]:
     """
     Calcola le metriche stress/focus/calm dai dati emotivi.
     """
     if not emotion_data or 'probs' not in emotion_data:
         return {'stress': 25.0, 'calm': 50.0, 'focus': 50.0}
-        
-    return _map_emotions_to_metrics(emotion_data['probs'])
\ No newline at end of file
+    
+    probs = emotion_data['probs']
+    probs_array = np.fromiter((probs.get(label, 0.0) for label in EMOTION_LABELS),
+                              dtype=np.float32, count=len(EMOTION_LABELS))
+    return _map_emotions_to_metrics(probs_array)
\ No newline at end of file
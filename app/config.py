@@ -28,24 +28,114 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{basedir / "database.db"}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable event system to save memory
     
+    # Create tables and seed sample data at startup (set to 0 and run `flask init-db` in production)
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', '1') == '1'
+    
+    # Sort keys of JSON responses (off: saves a sort per dict on every response)
+    JSON_SORT_KEYS = os.environ.get('JSON_SORT_KEYS', '0') == '1'
+    
+    # Gzip JSON/HTML responses for clients sending Accept-Encoding: gzip
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIMETYPES = {'application/json', 'text/html'}
+    COMPRESS_LEVEL = 5
+    COMPRESS_MIN_SIZE = 500  # Bytes; smaller bodies are sent as is
+    
+    # API-only deployment: 404/500 handlers always answer JSON and never render the HTML error page
+    API_ONLY_MODE = os.environ.get('API_ONLY_MODE', '0') == '1'
+    
+    # Log a warning for requests issuing more SQL statements than this (0 disables; catches N+1 regressions)
+    SQL_QUERY_WARN_THRESHOLD = int(os.environ.get('SQL_QUERY_WARN_THRESHOLD', 0))
+    
     # File upload configuration
     UPLOAD_FOLDER = basedir / 'data' / 'simulations'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'csv'}  # Only allow CSV files for simulation data
+    UPLOAD_COPY_BUFFER_SIZE = 1024 * 1024  # Bytes per read/write when persisting an upload (werkzeug default is 16KB)
+    
+    # Analyze uploaded simulation CSVs in background threads; POST /api/drivers answers 202 right after the upload
+    SIMULATION_PROCESS_ASYNC = os.environ.get('SIMULATION_PROCESS_ASYNC', '1') == '1'
+    SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', 2))
     
     # Application-specific configuration
     DRIVERS_PER_PAGE = 20  # Pagination setting for drivers list
+    DRIVERS_MAX_PER_PAGE = 500  # Upper bound for the ?limit= of the paginated drivers API
+    DRIVERS_STREAM_MIN_COUNT = 5000  # Above this many drivers the full list is streamed instead of cached in memory
+    DRIVER_CACHE_TTL = 30  # Seconds a driver's name stays cached for the monitoring page
+    DRIVER_CACHE_MAX_SIZE = 1024  # Drivers kept in that cache (least recently used evicted first)
+    DRIVER_DATA_CACHE_TTL = 10  # Seconds a driver's serialized data stays cached for the detail/monitoring APIs
     MONITORING_UPDATE_INTERVAL = 3  # Seconds between monitoring data updates
+    EMOTION_DATA_COALESCE_MS = 100  # Polls of /monitor/data for one driver within this window share a frame
     
     # AI/ML configuration for emotion detection
     EMOTION_MODEL_PATH = os.environ.get('EMOTION_MODEL_PATH') or (basedir / 'app' / 'ai' / 'models' / 'frank_emotion_detector_model.keras')
     HAAR_CASCADE_PATH = os.environ.get('HAAR_CASCADE_PATH') or (basedir / 'app' / 'ai' / 'haarcascades' / 'haarcascade_frontalface_default.xml')
+    # Optional YuNet DNN face detector; Haar cascade is used when the file is missing
+    FACE_DETECTOR_PATH = os.environ.get('FACE_DETECTOR_PATH') or (basedir / 'app' / 'ai' / 'models' / 'face_detection_yunet_2023mar.onnx')
+    # YuNet confidence and NMS thresholds
+    FACE_DETECTOR_SCORE_THRESHOLD = float(os.environ.get('FACE_DETECTOR_SCORE_THRESHOLD', 0.6))
+    FACE_DETECTOR_NMS_THRESHOLD = float(os.environ.get('FACE_DETECTOR_NMS_THRESHOLD', 0.3))
+    
+    # Load the emotion model in a background thread at startup instead of on the first frame
+    EMOTION_PRELOAD_MODEL = os.environ.get('EMOTION_PRELOAD_MODEL', '1') == '1'
+    
+    # Run Keras inference on the first GPU when one is available
+    EMOTION_USE_GPU = os.environ.get('EMOTION_USE_GPU', '1') == '1'
+    
+    # Threads for the TFLite interpreter when EMOTION_MODEL_PATH points to a .tflite file
+    # (kept low like EMOTION_ORT_THREADS: concurrent requests and gunicorn workers share the cores)
+    EMOTION_TFLITE_THREADS = int(os.environ.get('EMOTION_TFLITE_THREADS', 2))
+    
+    # ONNX Runtime intra-op threads (used when EMOTION_MODEL_PATH is a .onnx file or one sits next to the .keras model)
+    EMOTION_ORT_THREADS = int(os.environ.get('EMOTION_ORT_THREADS', 2))
     
     # Preprocessing mode for emotion model:
     # - 'rgb01'   -> BGR->RGB + /255.0 (pipeline standard)
     # - 'raw_bgr' -> BGR uint8 0..255 (come nel notebook condiviso)
     EMOTION_PREPROCESS_MODE = os.environ.get('EMOTION_PREPROCESS_MODE', 'raw_bgr')
     
+    # Input tensor layout expected by the model: 'NHWC' (Keras default) or 'NCHW' (channels-first exports)
+    EMOTION_MODEL_LAYOUT = os.environ.get('EMOTION_MODEL_LAYOUT', 'NHWC').upper()
+    
+    # JPEG decode reduction factor for webcam frames (1, 2, 4 or 8).
+    # Frames are decoded directly at 1/N resolution by libjpeg; bbox coordinates
+    # returned to the client are scaled back to the original frame size.
+    EMOTION_DECODE_REDUCTION = int(os.environ.get('EMOTION_DECODE_REDUCTION', 2))
+    
+    # Longest side (px) of the grayscale image used for Haar face detection
+    FACE_DETECT_MAX_SIDE = int(os.environ.get('FACE_DETECT_MAX_SIDE', 320))
+    
+    # Haar pyramid step and largest face searched, as a fraction of the shorter side of the detection image
+    FACE_DETECT_SCALE_FACTOR = float(os.environ.get('FACE_DETECT_SCALE_FACTOR', 1.2))
+    FACE_DETECT_MAX_FACE_RATIO = float(os.environ.get('FACE_DETECT_MAX_FACE_RATIO', 0.75))
+    
+    # Run a full face detection every N frames of a driver and reuse its last bbox in between (1 = every frame)
+    EMOTION_DETECT_EVERY_N = int(os.environ.get('EMOTION_DETECT_EVERY_N', 5))
+    
+    # Between full detections, re-locate the face with a cheap Haar search around the last bbox instead of reusing it as-is
+    EMOTION_TRACK_ROI_DETECT = os.environ.get('EMOTION_TRACK_ROI_DETECT', '1') == '1'
+    
+    # Frames whose grayscale std-dev is below this value skip detection/inference (0 = disabled)
+    EMOTION_MIN_STD = float(os.environ.get('EMOTION_MIN_STD', 12))
+    
+    # Max faces waiting for the batching inference thread (with EMOTION_BATCH_MAX > 1)
+    EMOTION_PIPELINE_QUEUE_SIZE = int(os.environ.get('EMOTION_PIPELINE_QUEUE_SIZE', 2))
+    
+    # OpenCV worker threads used by each face detection. Concurrent request threads
+    # already run detections in parallel, so more than 1 oversubscribes the CPU under load;
+    # raise it only for a single stream on a multi-core machine
+    OPENCV_NUM_THREADS = int(os.environ.get('OPENCV_NUM_THREADS', 1))
+    
+    # Max faces stacked into a single model call and how long to wait for more. Off by default
+    # (1): a single stream would only pay the wait; enable it when many streams share the model
+    EMOTION_BATCH_MAX = int(os.environ.get('EMOTION_BATCH_MAX', 1))
+    EMOTION_BATCH_WAIT_MS = float(os.environ.get('EMOTION_BATCH_WAIT_MS', 8))
+    # Max wait for a slot in the batch queue and for the batched result before running the inference inline
+    EMOTION_BATCH_TIMEOUT_MS = float(os.environ.get('EMOTION_BATCH_TIMEOUT_MS', 1000))
+    
+    # Reuse the last result for near-identical frames of the same driver (8x8 average-hash Hamming distance, max age; 0 ms disables)
+    EMOTION_DEDUP_MAX_DISTANCE = int(os.environ.get('EMOTION_DEDUP_MAX_DISTANCE', 4))
+    EMOTION_DEDUP_MAX_AGE_MS = float(os.environ.get('EMOTION_DEDUP_MAX_AGE_MS', 2000))
+    
     @staticmethod
     def validate_file_extension(filename):
         """
@@ -11,8 +11,16 @@ Date: 2025
 
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql.functions import FunctionElement
 from . import db
 
+# Unbound method bound once at import: saves an attribute lookup per timestamp
+# in the to_dict() serialization loops
+_ISO = datetime.isoformat
+
 class Classification(Enum):
     """
     Enumeration for driver classification types.
@@ -42,6 +50,58 @@ class MonitoringStatus(Enum):
     def __str__(self):
         return self.value
 
+class seconds_between(FunctionElement):
+    """SQL expression for the seconds elapsed between two DateTime columns."""
+    type = Float()
+    inherit_cache = True
+
+@compiles(seconds_between)
+def _seconds_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)}))"
+
+@compiles(seconds_between, 'sqlite')
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"((julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)})) * 86400.0)"
+
+class utcnow(FunctionElement):
+    """
+    SQL expression for the current UTC time, used as column default.
+    
+    Rendered inline in INSERT/UPDATE statements, so timestamps are filled in by
+    the database instead of being computed in Python and bound per row (multi-row
+    INSERTs stay a single statement); on SQLite milliseconds are kept.
+    """
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, 'mysql')
+def _utcnow_mysql(element, compiler, **kw):
+    # CURRENT_TIMESTAMP is in the session time zone on MySQL
+    return "UTC_TIMESTAMP()"
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
+def _enum_value(value):
+    """Return the stored string for an enum member (plain strings pass through)."""
+    return value.value if isinstance(value, Enum) else value
+
+def _values_check(column, enum_class):
+    """Build a CHECK constraint restricting a String column to the enum values."""
+    values = ', '.join(f"'{member.value}'" for member in enum_class)
+    return db.CheckConstraint(f"{column} IN ({values})", name=f'ck_drivers_{column}')
+
 class Driver(db.Model):
     """
     Driver model representing an individual driver in the system.
@@ -53,8 +113,8 @@ class Driver(db.Model):
         id (int): Primary key identifier for the driver
         first_name (str): Driver's first name
         last_name (str): Driver's last name
-        classification (Classification): Current classification status
-        monitoring_status (MonitoringStatus): Current monitoring state
+        classification (str): Current classification status (a Classification value)
+        monitoring_status (str): Current monitoring state (a MonitoringStatus value)
         simulation_file (str): Path/name of the associated simulation CSV file
         created_at (datetime): Timestamp when the driver was registered
         updated_at (datetime): Timestamp of the last update
@@ -62,6 +122,20 @@ class Driver(db.Model):
     
     __tablename__ = 'drivers'
     
+    # Secondary indexes for status/classification filters, the listing order
+    # (newest first, read backwards) and name lookups; the name index is unique,
+    # so the database itself rejects duplicate drivers. On PostgreSQL the
+    # monitoring index is partial, since most drivers are offline at any given time
+    __table_args__ = (
+        _values_check('classification', Classification),
+        _values_check('monitoring_status', MonitoringStatus),
+        db.Index('ix_drivers_monitoring_status', 'monitoring_status',
+                 postgresql_where=db.text(f"monitoring_status <> '{MonitoringStatus.OFFLINE.value}'")),
+        db.Index('ix_drivers_classification', 'classification'),
+        db.Index('ix_drivers_created_at', 'created_at', 'id'),
+        db.Index('uq_drivers_last_first', 'last_name', 'first_name', unique=True),
+    )
+    
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     
@@ -69,30 +143,32 @@ class Driver(db.Model):
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     
-    # Classification and status using Enum types
-    classification = db.Column(db.Enum(Classification), 
-                             default=Classification.UNCLASSIFIED, 
+    # Classification and status stored as the enum values: rows load as plain
+    # strings, with no Enum coercion per column per row (integrity via CHECK)
+    classification = db.Column(db.String(16), 
+                             default=Classification.UNCLASSIFIED.value, 
                              nullable=False)
-    monitoring_status = db.Column(db.Enum(MonitoringStatus), 
-                                default=MonitoringStatus.OFFLINE, 
+    monitoring_status = db.Column(db.String(16), 
+                                default=MonitoringStatus.OFFLINE.value, 
                                 nullable=False)
     
     # File information
     simulation_file = db.Column(db.String(255), nullable=True)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, 
-                          onupdate=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), 
+                          onupdate=utcnow(), nullable=False)
     
-    # Relationships
+    # Relationships (lazy='raise': load them explicitly with selectinload, so that
+    # serializing a list of drivers can never fall into one SELECT per driver)
     classification_results = db.relationship('ClassificationResult', 
-                                           backref='driver', 
-                                           lazy=True, 
+                                           back_populates='driver', 
+                                           lazy='raise', 
                                            cascade='all, delete-orphan')
     monitoring_sessions = db.relationship('MonitoringSession', 
-                                        backref='driver', 
-                                        lazy=True, 
+                                        back_populates='driver', 
+                                        lazy='raise', 
                                         cascade='all, delete-orphan')
     
     def __init__(self, first_name, last_name, classification=Classification.UNCLASSIFIED, 
@@ -103,14 +179,14 @@ class Driver(db.Model):
         Args:
             first_name (str): Driver's first name
             last_name (str): Driver's last name
-            classification (Classification): Initial classification (default: UNCLASSIFIED)
-            monitoring_status (MonitoringStatus): Initial monitoring status (default: OFFLINE)
+            classification (Classification | str): Initial classification (default: UNCLASSIFIED)
+            monitoring_status (MonitoringStatus | str): Initial monitoring status (default: OFFLINE)
             simulation_file (str, optional): Associated simulation file name
         """
         self.first_name = first_name
         self.last_name = last_name
-        self.classification = classification
-        self.monitoring_status = monitoring_status
+        self.classification = _enum_value(classification)
+        self.monitoring_status = _enum_value(monitoring_status)
         self.simulation_file = simulation_file
     
     def get_full_name(self):
@@ -129,45 +205,55 @@ class Driver(db.Model):
         Returns:
             dict: Dictionary representation of the driver
         """
+        created_at = self.created_at
+        updated_at = self.updated_at
         return {
             'id': self.id,
             'firstName': self.first_name,
             'lastName': self.last_name,
-            'classification': self.classification.value,
-            'monitoringStatus': self.monitoring_status.value,
+            'classification': self.classification,
+            'monitoringStatus': self.monitoring_status,
             'simulationFile': self.simulation_file,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
+            'createdAt': _ISO(created_at) if created_at else None,
+            'updatedAt': _ISO(updated_at) if updated_at else None
         }
     
-    def update_classification(self, new_classification):
+    def update_classification(self, new_classification, confidence_score=None):
         """
-        Update the driver's classification and record the change.
+        Update the driver's classification and build the matching history row.
+        
+        The row is returned rather than added to the session, so that callers
+        classifying several drivers can insert all rows with a single statement
+        (see ClassificationService.record_classification_results).
         
         Args:
-            new_classification (Classification): New classification to assign
+            new_classification (Classification | str): New classification to assign
+            confidence_score (float, optional): Confidence level of the classification
+            
+        Returns:
+            dict: Column values for a ClassificationResult row
         """
-        old_classification = self.classification
-        self.classification = new_classification
-        self.updated_at = datetime.utcnow()
+        old_classification = Classification(self.classification)
+        new_classification = Classification(new_classification)
+        self.classification = new_classification.value
+        self.updated_at = utcnow()
         
-        # Create a classification result record
-        result = ClassificationResult(
-            driver_id=self.id,
-            old_classification=old_classification,
-            new_classification=new_classification
-        )
-        db.session.add(result)
+        return {
+            'driver_id': self.id,
+            'old_classification': old_classification,
+            'new_classification': new_classification,
+            'confidence_score': confidence_score
+        }
     
     def update_monitoring_status(self, new_status):
         """
         Update the driver's monitoring status.
         
         Args:
-            new_status (MonitoringStatus): New monitoring status to assign
+            new_status (MonitoringStatus | str): New monitoring status to assign
         """
-        self.monitoring_status = new_status
-        self.updated_at = datetime.utcnow()
+        self.monitoring_status = _enum_value(new_status)
+        self.updated_at = utcnow()
     
     def __repr__(self):
         """String representation of the Driver object."""
@@ -198,7 +284,7 @@ class SimulationData(db.Model):
     data_points = db.Column(db.Integer, nullable=True)
     duration = db.Column(db.Float, nullable=True)
     average_speed = db.Column(db.Float, nullable=True)
-    processed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), nullable=False)
     
     def __init__(self, driver_id, file_path, data_points=None, 
                  duration=None, average_speed=None):
@@ -220,6 +306,7 @@ class SimulationData(db.Model):
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
+        processed_at = self.processed_at
         return {
             'id': self.id,
             'driverId': self.driver_id,
@@ -227,7 +314,7 @@ class SimulationData(db.Model):
             'dataPoints': self.data_points,
             'duration': self.duration,
             'averageSpeed': self.average_speed,
-            'processedAt': self.processed_at.isoformat() if self.processed_at else None
+            'processedAt': _ISO(processed_at) if processed_at else None
         }
     
     def __repr__(self):
@@ -251,12 +338,19 @@ class ClassificationResult(db.Model):
     
     __tablename__ = 'classification_results'
     
+    # Per-driver history ordered by date is an index range scan, no sort
+    __table_args__ = (
+        db.Index('ix_classification_results_driver_date', 'driver_id', 'classified_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('drivers.id'), nullable=False)
     old_classification = db.Column(db.Enum(Classification), nullable=True)
     new_classification = db.Column(db.Enum(Classification), nullable=False)
     confidence_score = db.Column(db.Float, nullable=True)
-    classified_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    classified_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), nullable=False)
+    
+    driver = db.relationship('Driver', back_populates='classification_results')
     
     def __init__(self, driver_id, new_classification, old_classification=None, 
                  confidence_score=None):
@@ -276,13 +370,15 @@ class ClassificationResult(db.Model):
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
+        old_classification = self.old_classification
+        classified_at = self.classified_at
         return {
             'id': self.id,
             'driverId': self.driver_id,
-            'oldClassification': self.old_classification.value if self.old_classification else None,
+            'oldClassification': old_classification.value if old_classification else None,
             'newClassification': self.new_classification.value,
             'confidenceScore': self.confidence_score,
-            'classifiedAt': self.classified_at.isoformat() if self.classified_at else None
+            'classifiedAt': _ISO(classified_at) if classified_at else None
         }
     
     def __repr__(self):
@@ -308,11 +404,13 @@ class MonitoringSession(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('drivers.id'), nullable=False)
-    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), nullable=False)
     ended_at = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default='active', nullable=False)
     emotion_data_points = db.Column(db.Integer, default=0, nullable=False)
     
+    driver = db.relationship('Driver', back_populates='monitoring_sessions')
+    
     def __init__(self, driver_id, status='active'):
         """
         Initialize a new MonitoringSession instance.
@@ -326,9 +424,27 @@ class MonitoringSession(db.Model):
     
     def end_session(self):
         """Mark the monitoring session as ended."""
-        self.ended_at = datetime.utcnow()
+        # Same clock and precision as started_at: filled in by the database on flush
+        self.ended_at = utcnow()
         self.status = 'completed'
     
+    @hybrid_property
+    def duration_seconds(self):
+        """
+        Duration of the monitoring session in seconds (None while active).
+        
+        At class level this is a SQL expression, so queries such as
+        select(MonitoringSession.id, MonitoringSession.duration_seconds)
+        compute durations in the database instead of per row in Python.
+        """
+        if self.ended_at:
+            return (self.ended_at - self.started_at).total_seconds()
+        return None
+    
+    @duration_seconds.expression
+    def duration_seconds(cls):
+        return seconds_between(cls.started_at, cls.ended_at)
+    
     def get_duration(self):
         """
         Calculate the duration of the monitoring session.
@@ -336,17 +452,17 @@ class MonitoringSession(db.Model):
         Returns:
             float: Duration in seconds, or None if session is still active
         """
-        if self.ended_at:
-            return (self.ended_at - self.started_at).total_seconds()
-        return None
+        return self.duration_seconds
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
+        started_at = self.started_at
+        ended_at = self.ended_at
         return {
             'id': self.id,
             'driverId': self.driver_id,
-            'startedAt': self.started_at.isoformat() if self.started_at else None,
-            'endedAt': self.ended_at.isoformat() if self.ended_at else None,
+            'startedAt': _ISO(started_at) if started_at else None,
+            'endedAt': _ISO(ended_at) if ended_at else None,
             'status': self.status,
             'emotionDataPoints': self.emotion_data_points,
             'duration': self.get_duration()
@@ -11,20 +11,120 @@ Date: 2024
 
 import os
 import time
-from flask import Blueprint, render_template, request, jsonify, current_app, send_from_directory
-from werkzeug.exceptions import BadRequest
+import hashlib
+import functools
+from datetime import datetime
+from flask import (Blueprint, render_template, request, jsonify, current_app, send_from_directory,
+                   stream_with_context)
+from werkzeug.exceptions import BadRequest, HTTPException
 
 from .services import (
     DriverService, 
     ClassificationService, 
     MonitoringService, 
-    FileUploadService
+    FileUploadService,
+    ValidationError,
+    DRIVER_INCLUDES
 )
 from .models import Classification, MonitoringStatus
 
 # Create Blueprint for main routes
 main_bp = Blueprint('main', __name__)
 
+# Landing page HTML and its ETag, rendered once (the page has no dynamic content)
+_landing_page_cache = None
+
+# Serialized full drivers lists: includes -> (table fingerprint, JSON body)
+_drivers_list_cache = {}
+
+# URL prefix of the JSON API: error handlers answer JSON instead of the HTML error page under it
+_API_PREFIX = '/api/'
+
+# Stored monitoring statuses from which a new session can be started
+_STARTABLE_STATUSES = frozenset({MonitoringStatus.OFFLINE.value, MonitoringStatus.ONLINE.value})
+
+# Content types of frames posted as raw image bytes (anything else must be JSON)
+_FRAME_MIMETYPES = frozenset({'image/jpeg', 'image/png', 'application/octet-stream'})
+
+# Directory holding favicon.ico, resolved once instead of on every request
+_FAVICON_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'static'))
+
+def _err(message, status):
+    """Build the standard JSON error response: {"success": false, "error": message}."""
+    return jsonify({'success': False, 'error': message}), status
+
+class _ConstantJSON:
+    """
+    JSON response with a fixed payload, serialized once on first use.
+    
+    Every call returns a fresh Response around the same bytes, so constant
+    bodies (health check, fixed error and confirmation messages) skip the
+    dict construction and the serializer on each request.
+    """
+    
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+        self._body = None
+    
+    def __call__(self):
+        if self._body is None:
+            self._body = current_app.json.dumps(self.payload).encode('utf-8')
+        return current_app.response_class(self._body, status=self.status, mimetype='application/json')
+
+def _constant_err(message, status):
+    """Constant counterpart of _err for error messages known at import time."""
+    return _ConstantJSON({'success': False, 'error': message}, status)
+
+_PAGINATION_INVALID = _constant_err('Parametri di paginazione non validi', 400)
+_FIRST_NAME_REQUIRED = _constant_err('Il nome è obbligatorio', 400)
+_LAST_NAME_REQUIRED = _constant_err('Il cognome è obbligatorio', 400)
+_FRAME_EMPTY = _constant_err('Frame vuoto', 400)
+_FRAME_BAD_CONTENT_TYPE = _constant_err('Content-Type deve essere application/json o image/jpeg', 400)
+_FRAME_IMAGE_REQUIRED = _constant_err('Campo "image" richiesto nel body JSON', 400)
+_FRAME_IMAGE_INVALID = _constant_err('Immagine base64 non valida', 400)
+_API_NOT_FOUND = _constant_err('Endpoint non trovato', 404)
+_API_INTERNAL_ERROR = _constant_err('Errore interno del server', 500)
+
+_DRIVER_DELETED = _ConstantJSON({'success': True, 'message': 'Autista eliminato con successo'})
+_MONITORING_STARTED = _ConstantJSON({'success': True, 'message': 'Monitoraggio avviato con successo'})
+_MONITORING_STOPPED = _ConstantJSON({'success': True, 'message': 'Monitoraggio interrotto'})
+_HEALTHY = _ConstantJSON({
+    'success': True,
+    'status': 'healthy',
+    'message': 'Driver Management System is running'
+})
+
+def api_endpoint(error_message):
+    """
+    Decorator providing the common error handling of the API endpoints.
+    
+    The wrapped view only builds the success response; here ValidationError
+    (raised by the services on invalid input) becomes a 400 with its message,
+    HTTP exceptions keep their status, and anything else is logged and
+    answered with a 500 carrying error_message. One try frame per request
+    instead of the same try/except block repeated in every view.
+    
+    Args:
+        error_message (str): Error returned to the client on unexpected failures
+    """
+    def decorator(view):
+        internal_error_response = _constant_err(error_message, 500)
+        
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except ValidationError as e:
+                return _err(str(e), 400)
+            except HTTPException as e:
+                return _err(e.description, e.code)
+            except Exception as e:
+                current_app.logger.error(f"Error in {request.method} {request.path}: {str(e)}")
+                return internal_error_response()
+        return wrapper
+    return decorator
+
 # ================================
 # WEB PAGE ROUTES (HTML Templates)
 # ================================
@@ -37,10 +137,28 @@ def landing_page():
     This page provides an overview of the driver management system workflow
     and serves as the entry point for users.
     
+    The page is static, so outside debug mode it is rendered on the first
+    request only and then served from memory with an ETag and a short
+    public Cache-Control, skipping Jinja on every hit.
+    
     Returns:
-        str: Rendered HTML template for the landing page
+        Response: HTML response for the landing page
     """
-    return render_template('landing_page.html')
+    global _landing_page_cache
+    
+    if current_app.debug:
+        return render_template('landing_page.html')
+    
+    if _landing_page_cache is None:
+        html = render_template('landing_page.html')
+        _landing_page_cache = (html, hashlib.md5(html.encode('utf-8')).hexdigest())
+    html, etag = _landing_page_cache
+    
+    response = current_app.response_class(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
 
 @main_bp.route('/drivers')
 def drivers_page():
@@ -69,8 +187,8 @@ def monitor_page(driver_id):
     Returns:
         str: Rendered HTML template for the monitoring page
     """
-    # Verify that the driver exists
-    driver = DriverService.get_driver_by_id(driver_id)
+    # Verify that the driver exists (the template only renders id and name)
+    driver = DriverService.get_driver_summary(driver_id)
     if not driver:
         return render_template('error.html', 
                              error_message=f"Autista con ID {driver_id} non trovato"), 404
@@ -82,6 +200,7 @@ def monitor_page(driver_id):
 # ===============================
 
 @main_bp.route('/api/drivers', methods=['GET'])
+@api_endpoint('Errore nel recupero degli autisti')
 def api_get_drivers():
     """
     API endpoint to retrieve all drivers.
@@ -89,6 +208,24 @@ def api_get_drivers():
     Returns a JSON list of all registered drivers with their current
     status and classification information.
     
+    With ``?limit=`` and/or ``?after_id=`` the list is paginated by ID
+    (keyset): pass the returned ``nextCursor`` (also in the ``X-Next-Cursor``
+    header) as ``after_id`` to fetch the next page, instead of requesting
+    the full table.
+    
+    The full list carries an ETag derived from a fingerprint of the drivers
+    table: polls with a matching If-None-Match get 304 without the list being
+    loaded, and the serialized body is reused until a driver changes.
+    
+    ``?include=classification,monitoring`` embeds each driver's latest
+    classification result and monitoring session, so a dashboard needs no
+    per-driver classify/monitor calls (unknown names are ignored).
+    
+    Above DRIVERS_STREAM_MIN_COUNT drivers the full list is not cached but
+    streamed: the JSON array is written one driver at a time while rows are
+    still being fetched, so the first byte goes out right away and memory
+    does not grow with the table.
+    
     Returns:
         Response: JSON response containing list of drivers
         
@@ -107,24 +244,66 @@ def api_get_drivers():
             ]
         }
     """
-    try:
-        drivers = DriverService.get_all_drivers()
-        drivers_data = [driver.to_dict() for driver in drivers]
-        
-        return jsonify({
+    if 'limit' in request.args or 'after_id' in request.args:
+        try:
+            after_id = int(request.args.get('after_id', 0))
+            limit = int(request.args.get('limit', current_app.config['DRIVERS_PER_PAGE']))
+        except ValueError:
+            return _PAGINATION_INVALID()
+        limit = max(1, min(limit, current_app.config['DRIVERS_MAX_PER_PAGE']))
+        
+        drivers_data, next_cursor = DriverService.get_drivers_page(after_id, limit)
+        response = jsonify({
             'success': True,
             'data': drivers_data,
-            'count': len(drivers_data)
+            'count': len(drivers_data),
+            'nextCursor': next_cursor
         })
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving drivers: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nel recupero degli autisti'
-        }), 500
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+        return response
+    
+    includes = DRIVER_INCLUDES.intersection(request.args.get('include', '').split(','))
+    include_key = tuple(sorted(includes))
+    
+    # Classifying and starting/stopping monitoring both touch the driver's
+    # updated_at, so the fingerprint also covers the included objects
+    fingerprint = DriverService.get_drivers_fingerprint()
+    etag = hashlib.blake2b(repr((fingerprint, include_key)).encode('utf-8'), digest_size=16).hexdigest()
+    
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    elif fingerprint[0] > current_app.config['DRIVERS_STREAM_MIN_COUNT']:
+        response = current_app.response_class(stream_with_context(_stream_drivers_list(includes)),
+                                              mimetype='application/json')
+    else:
+        cached = _drivers_list_cache.get(include_key)
+        if cached is None or cached[0] != fingerprint:
+            drivers_data = DriverService.get_all_drivers_data(includes)
+            body = jsonify({
+                'success': True,
+                'data': drivers_data,
+                'count': len(drivers_data)
+            }).get_data()
+            cached = _drivers_list_cache[include_key] = (fingerprint, body)
+        response = current_app.response_class(cached[1], mimetype='application/json')
+    
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def _stream_drivers_list(includes):
+    """Yield the drivers list response body as JSON text, one driver at a time."""
+    dumps = current_app.json.dumps
+    count = 0
+    yield '{"success": true, "data": ['
+    for data in DriverService.iter_all_drivers_data(includes):
+        yield dumps(data) if count == 0 else ',' + dumps(data)
+        count += 1
+    yield f'], "count": {count}}}'
 
 @main_bp.route('/api/drivers', methods=['POST'])
+@api_endpoint('Errore interno del server')
 def api_add_driver():
     """
     API endpoint to add a new driver.
@@ -132,6 +311,10 @@ def api_add_driver():
     Accepts multipart/form-data with driver information and simulation file.
     Creates a new driver record and processes the uploaded CSV file.
     
+    With SIMULATION_PROCESS_ASYNC (default) the CSV is analyzed in the
+    background and the response is 202 Accepted as soon as the file is
+    stored; otherwise it is processed inline and the response is 201.
+    
     Expected Form Data:
         - firstName (str): Driver's first name
         - lastName (str): Driver's last name
@@ -153,56 +336,38 @@ def api_add_driver():
             "message": "Autista aggiunto con successo"
         }
     """
-    try:
-        # Validate request content type
-        if not (request.content_type and 'multipart/form-data' in request.content_type):
-            raise BadRequest("Richiesta deve essere multipart/form-data")
-        
-        # Extract form data
-        first_name = request.form.get('firstName', '').strip()
-        last_name = request.form.get('lastName', '').strip()
-        simulation_file = request.files.get('simulationFile')
-        
-        # Validate required fields
-        if not first_name:
-            return jsonify({
-                'success': False,
-                'error': 'Il nome è obbligatorio'
-            }), 400
-            
-        if not last_name:
-            return jsonify({
-                'success': False,
-                'error': 'Il cognome è obbligatorio'
-            }), 400
-        
-        # Create new driver
-        new_driver = DriverService.create_driver(
-            first_name=first_name,
-            last_name=last_name,
-            simulation_file=simulation_file
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': new_driver.to_dict(),
-            'message': 'Autista aggiunto con successo'
-        }), 201
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
+    # Validate request content type
+    if not (request.content_type and 'multipart/form-data' in request.content_type):
+        raise BadRequest("Richiesta deve essere multipart/form-data")
+    
+    # Extract form data
+    first_name = request.form.get('firstName', '').strip()
+    last_name = request.form.get('lastName', '').strip()
+    simulation_file = request.files.get('simulationFile')
+    
+    # Validate required fields
+    if not first_name:
+        return _FIRST_NAME_REQUIRED()
         
-    except Exception as e:
-        current_app.logger.error(f"Error adding driver: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore interno del server'
-        }), 500
+    if not last_name:
+        return _LAST_NAME_REQUIRED()
+    
+    # Create new driver
+    new_driver = DriverService.create_driver(
+        first_name=first_name,
+        last_name=last_name,
+        simulation_file=simulation_file
+    )
+    
+    processing_deferred = bool(simulation_file) and current_app.config['SIMULATION_PROCESS_ASYNC']
+    return jsonify({
+        'success': True,
+        'data': new_driver.to_dict(),
+        'message': 'Autista aggiunto con successo'
+    }), 202 if processing_deferred else 201
 
 @main_bp.route('/api/drivers/<int:driver_id>', methods=['GET'])
+@api_endpoint('Errore nel recupero dell\'autista')
 def api_get_driver(driver_id):
     """
     API endpoint to retrieve a specific driver by ID.
@@ -228,27 +393,17 @@ def api_get_driver(driver_id):
             }
         }
     """
-    try:
-        driver = DriverService.get_driver_by_id(driver_id)
-        if not driver:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
-        return jsonify({
-            'success': True,
-            'data': driver.to_dict()
-        })
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nel recupero dell\'autista'
-        }), 500
+    driver_data = DriverService.get_driver_data(driver_id)
+    if driver_data is None:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    return jsonify({
+        'success': True,
+        'data': driver_data
+    })
 
 @main_bp.route('/api/drivers/<int:driver_id>', methods=['PUT', 'PATCH'])
+@api_endpoint('Errore interno del server')
 def api_update_driver(driver_id):
     """
     API endpoint to update a driver's information.
@@ -287,57 +442,41 @@ def api_update_driver(driver_id):
             "message": "Autista aggiornato con successo"
         }
     """
-    try:
-        first_name = None
-        last_name = None
-        simulation_file = None
-        
-        # Handle JSON or form data
-        if request.is_json:
-            data = request.get_json()
-            first_name = data.get('firstName', '').strip() if data.get('firstName') else None
-            last_name = data.get('lastName', '').strip() if data.get('lastName') else None
-        else:
-            # Handle form data (potentially multipart with file)
-            first_name = request.form.get('firstName', '').strip() if request.form.get('firstName') else None
-            last_name = request.form.get('lastName', '').strip() if request.form.get('lastName') else None
-            simulation_file = request.files.get('simulationFile')
-        
-        # Validate that at least one field is being updated
-        if not any([first_name, last_name, simulation_file]):
-            return jsonify({
-                'success': False,
-                'error': 'Almeno un campo deve essere fornito per l\'aggiornamento'
-            }), 400
-        
-        # Update driver
-        updated_driver = DriverService.update_driver(
-            driver_id=driver_id,
-            first_name=first_name,
-            last_name=last_name,
-            simulation_file=simulation_file
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': updated_driver.to_dict(),
-            'message': 'Autista aggiornato con successo'
-        })
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-        
-    except Exception as e:
-        current_app.logger.error(f"Error updating driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore interno del server'
-        }), 500
+    first_name = None
+    last_name = None
+    simulation_file = None
+    
+    # Handle JSON or form data
+    if request.is_json:
+        data = request.get_json()
+        first_name = data.get('firstName', '').strip() if data.get('firstName') else None
+        last_name = data.get('lastName', '').strip() if data.get('lastName') else None
+    else:
+        # Handle form data (potentially multipart with file)
+        first_name = request.form.get('firstName', '').strip() if request.form.get('firstName') else None
+        last_name = request.form.get('lastName', '').strip() if request.form.get('lastName') else None
+        simulation_file = request.files.get('simulationFile')
+    
+    # Validate that at least one field is being updated
+    if not any([first_name, last_name, simulation_file]):
+        return _err('Almeno un campo deve essere fornito per l\'aggiornamento', 400)
+    
+    # Update driver
+    updated_driver = DriverService.update_driver(
+        driver_id=driver_id,
+        first_name=first_name,
+        last_name=last_name,
+        simulation_file=simulation_file
+    )
+    
+    return jsonify({
+        'success': True,
+        'data': updated_driver.to_dict(),
+        'message': 'Autista aggiornato con successo'
+    })
 
 @main_bp.route('/api/drivers/<int:driver_id>', methods=['DELETE'])
+@api_endpoint('Errore interno del server')
 def api_delete_driver(driver_id):
     """
     API endpoint to delete a driver from the system.
@@ -356,28 +495,15 @@ def api_delete_driver(driver_id):
             "message": "Autista eliminato con successo"
         }
     """
-    try:
-        success = DriverService.delete_driver(driver_id)
-        
-        if not success:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
-        return jsonify({
-            'success': True,
-            'message': 'Autista eliminato con successo'
-        })
-        
-    except Exception as e:
-        current_app.logger.error(f"Error deleting driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore interno del server'
-        }), 500
+    success = DriverService.delete_driver(driver_id)
+    
+    if not success:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    return _DRIVER_DELETED()
 
 @main_bp.route('/api/drivers/<int:driver_id>/classify', methods=['GET'])
+@api_endpoint('Errore durante la classificazione')
 def api_classify_driver(driver_id):
     """
     API endpoint to classify a driver based on their simulation data.
@@ -402,44 +528,29 @@ def api_classify_driver(driver_id):
             "message": "Classificazione completata con successo"
         }
     """
-    try:
-        driver = DriverService.get_driver_by_id(driver_id)
-        if not driver:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
-        # Store previous classification for response
-        previous_classification = driver.classification.value
-        
-        # Perform classification
-        new_classification, confidence = ClassificationService.classify_driver(driver_id)
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'classification': new_classification.value,
-                'confidence': round(confidence, 2),
-                'previousClassification': previous_classification
-            },
-            'message': 'Classificazione completata con successo'
-        })
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-        
-    except Exception as e:
-        current_app.logger.error(f"Error classifying driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore durante la classificazione'
-        }), 500
+    # Driver and data points of its simulation in one SELECT
+    driver, data_points = ClassificationService.get_driver_with_data_points(driver_id)
+    if not driver:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    # Store previous classification for response
+    previous_classification = driver.classification
+    
+    # Perform classification (reusing the driver loaded above)
+    new_classification, confidence = ClassificationService.classify_driver(driver_id, driver, data_points)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'classification': new_classification.value,
+            'confidence': round(confidence, 2),
+            'previousClassification': previous_classification
+        },
+        'message': 'Classificazione completata con successo'
+    })
 
 @main_bp.route('/api/drivers/<int:driver_id>/monitor', methods=['GET'])
+@api_endpoint('Errore nel recupero dei dati di monitoraggio')
 def api_get_monitoring_data(driver_id):
     """
     API endpoint to retrieve monitoring data for a driver.
@@ -463,37 +574,25 @@ def api_get_monitoring_data(driver_id):
             }
         }
     """
-    try:
-        driver = DriverService.get_driver_by_id(driver_id)
-        if not driver:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
-        # Determine if monitoring can be started
-        can_start_monitoring = driver.monitoring_status in [
-            MonitoringStatus.OFFLINE, 
-            MonitoringStatus.ONLINE
-        ]
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'driver': driver.to_dict(),
-                'monitoringStatus': driver.monitoring_status.value,
-                'canStartMonitoring': can_start_monitoring
-            }
-        })
-        
-    except Exception as e:
-        current_app.logger.error(f"Error getting monitoring data for driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nel recupero dei dati di monitoraggio'
-        }), 500
+    driver_data = DriverService.get_driver_data(driver_id)
+    if driver_data is None:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    # Determine if monitoring can be started
+    monitoring_status = driver_data['monitoringStatus']
+    can_start_monitoring = monitoring_status in _STARTABLE_STATUSES
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'driver': driver_data,
+            'monitoringStatus': monitoring_status,
+            'canStartMonitoring': can_start_monitoring
+        }
+    })
 
 @main_bp.route('/api/drivers/<int:driver_id>/monitor/start', methods=['POST'])
+@api_endpoint('Errore nell\'avvio del monitoraggio')
 def api_start_monitoring(driver_id):
     """
     API endpoint to start monitoring a driver.
@@ -504,28 +603,12 @@ def api_start_monitoring(driver_id):
     Returns:
         Response: JSON response confirming monitoring start
     """
-    try:
-        MonitoringService.start_monitoring_session(driver_id)
-        
-        return jsonify({
-            'success': True,
-            'message': 'Monitoraggio avviato con successo'
-        })
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-        
-    except Exception as e:
-        current_app.logger.error(f"Error starting monitoring for driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nell\'avvio del monitoraggio'
-        }), 500
+    MonitoringService.start_monitoring_session(driver_id)
+    
+    return _MONITORING_STARTED()
 
 @main_bp.route('/api/drivers/<int:driver_id>/monitor/stop', methods=['POST'])
+@api_endpoint('Errore nell\'interruzione del monitoraggio')
 def api_stop_monitoring(driver_id):
     """
     API endpoint to stop monitoring a driver.
@@ -536,28 +619,12 @@ def api_stop_monitoring(driver_id):
     Returns:
         Response: JSON response confirming monitoring stop
     """
-    try:
-        MonitoringService.stop_monitoring_session(driver_id)
-        
-        return jsonify({
-            'success': True,
-            'message': 'Monitoraggio interrotto'
-        })
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-        
-    except Exception as e:
-        current_app.logger.error(f"Error stopping monitoring for driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nell\'interruzione del monitoraggio'
-        }), 500
+    MonitoringService.stop_monitoring_session(driver_id)
+    
+    return _MONITORING_STOPPED()
 
 @main_bp.route('/api/drivers/<int:driver_id>/monitor/data', methods=['GET'])
+@api_endpoint('Errore nel recupero dei dati emotivi')
 def api_get_realtime_emotion_data(driver_id):
     """
     API endpoint to get real-time emotion data for a monitoring session.
@@ -565,6 +632,9 @@ def api_get_realtime_emotion_data(driver_id):
     This endpoint simulates the reception of real-time emotional analysis data
     that would be generated from computer vision analysis of the driver's webcam feed.
     
+    Requests for the same driver within EMOTION_DATA_COALESCE_MS receive the
+    same frame, so generation cost grows with monitored drivers, not viewers.
+    
     Args:
         driver_id (int): ID of the driver being monitored
         
@@ -583,37 +653,25 @@ def api_get_realtime_emotion_data(driver_id):
             }
         }
     """
-    try:
-        # Verify driver exists and is being monitored
-        driver = DriverService.get_driver_by_id(driver_id)
-        if not driver:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
-        # Generate simulated emotion data
-        emotion_data = MonitoringService.generate_emotion_data()
-        
-        return jsonify({
-            'success': True,
-            'data': emotion_data
-        })
-        
-    except Exception as e:
-        current_app.logger.error(f"Error getting emotion data for driver {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nel recupero dei dati emotivi'
-        }), 500
+    # Verify driver exists (cached: this endpoint is polled every few seconds)
+    driver = DriverService.get_driver_summary(driver_id)
+    if not driver:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    # Generate simulated emotion data, at most once per coalescing window:
+    # concurrent tabs polling the same driver get the same serialized frame
+    body = MonitoringService.get_coalesced_emotion_response(driver_id)
+    return current_app.response_class(body, mimetype='application/json')
 
 @main_bp.route('/api/drivers/<int:driver_id>/monitor/frame', methods=['POST'])
+@api_endpoint('Errore nell\'analisi del frame')
 def api_analyze_emotion_frame(driver_id):
     """
     API endpoint per analizzare un frame della webcam e restituire dati emotivi.
     
-    Questo endpoint riceve un'immagine base64 catturata dalla webcam,
-    la analizza usando il modello Frank di emotion detection e restituisce
+    Questo endpoint riceve un'immagine catturata dalla webcam, come JPEG grezzo
+    (Content-Type image/jpeg o application/octet-stream) oppure come data URL
+    base64 in un body JSON, la analizza usando il modello Frank di emotion detection e restituisce
     i dati emotivi in tempo reale. In caso di errore o modello non disponibile,
     fa fallback ai dati mock.
     
@@ -621,6 +679,7 @@ def api_analyze_emotion_frame(driver_id):
         driver_id (int): ID dell'autista sotto monitoraggio
         
     Request Body:
+        byte JPEG grezzi del frame (image/jpeg), oppure
         {
             "image": "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD..."
         }
@@ -656,94 +715,82 @@ def api_analyze_emotion_frame(driver_id):
             }
         }
     """
-    try:
-        import datetime
-        
-        # Verifica che l'autista esista
-        driver = DriverService.get_driver_by_id(driver_id)
-        if not driver:
-            return jsonify({
-                'success': False,
-                'error': f'Autista con ID {driver_id} non trovato'
-            }), 404
-        
+    # Verifica che l'autista esista (in cache: l'endpoint riceve ogni frame)
+    driver = DriverService.get_driver_summary(driver_id)
+    if not driver:
+        return _err(f'Autista con ID {driver_id} non trovato', 404)
+    
+    # Frame binario: i byte JPEG arrivano direttamente, senza base64
+    frame_bytes = None
+    if request.mimetype in _FRAME_MIMETYPES:
+        frame_bytes = request.get_data(cache=False)
+        if not frame_bytes:
+            return _FRAME_EMPTY()
+    else:
         # Verifica che il body JSON contenga l'immagine
         if not request.is_json:
-            return jsonify({
-                'success': False,
-                'error': 'Content-Type deve essere application/json'
-            }), 400
+            return _FRAME_BAD_CONTENT_TYPE()
             
         data = request.get_json()
         if not data or 'image' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Campo "image" richiesto nel body JSON'
-            }), 400
+            return _FRAME_IMAGE_REQUIRED()
         
         image_data_url = data['image']
         if not image_data_url:
-            return jsonify({
-                'success': False,
-                'error': 'Immagine base64 non valida'
-            }), 400
+            return _FRAME_IMAGE_INVALID()
+    
+    # Tenta l'analisi con il modello AI
+    try:
+        from app.ai.emotion_detector import analyze_frame, analyze_frame_bytes, get_emotion_metrics
         
-        # Tenta l'analisi con il modello AI
-        try:
-            from app.ai.emotion_detector import analyze_frame, get_emotion_metrics
+        current_app.logger.debug(f"Analizzando frame per autista {driver_id}")
+        if frame_bytes is not None:
+            emotion_data = analyze_frame_bytes(frame_bytes, stream_id=driver_id)
+        else:
+            emotion_data = analyze_frame(image_data_url, stream_id=driver_id)
+        
+        if emotion_data is not None:
+            # Successo nell'analisi AI
+            metrics = get_emotion_metrics(emotion_data)
             
-            current_app.logger.debug(f"Analizzando frame per autista {driver_id}")
-            emotion_data = analyze_frame(image_data_url)
+            response_data = {
+                'time': datetime.now().strftime('%H:%M:%S'),
+                'stress': metrics['stress'],
+                'focus': metrics['focus'],
+                'calm': metrics['calm'],
+                'emotion': emotion_data['emotion'],
+                'probs': emotion_data['probs'],
+                'inferenceMs': emotion_data['inferenceMs'],
+                'bbox': emotion_data['bbox'],
+                'timestamp': time.time()
+            }
             
-            if emotion_data is not None:
-                # Successo nell'analisi AI
-                metrics = get_emotion_metrics(emotion_data)
-                
-                response_data = {
-                    'time': datetime.datetime.now().strftime('%H:%M:%S'),
-                    'stress': metrics['stress'],
-                    'focus': metrics['focus'],
-                    'calm': metrics['calm'],
-                    'emotion': emotion_data['emotion'],
-                    'probs': emotion_data['probs'],
-                    'inferenceMs': emotion_data['inferenceMs'],
-                    'bbox': emotion_data['bbox'],
-                    'timestamp': time.time()
-                }
-                
-                current_app.logger.debug(f"Analisi AI completata: {emotion_data['emotion']}, {emotion_data['inferenceMs']}ms")
-                
-                return jsonify({
-                    'success': True,
-                    'data': response_data
-                })
-            else:
-                # Analisi AI fallita, usa fallback
-                current_app.logger.info(f"Analisi AI fallita per autista {driver_id}, uso fallback mock")
-                
-        except ImportError as e:
-            # Modulo AI non disponibile
-            current_app.logger.warning(f"Modulo AI non disponibile: {e}")
+            current_app.logger.debug(f"Analisi AI completata: {emotion_data['emotion']}, {emotion_data['inferenceMs']}ms")
             
-        except Exception as e:
-            # Errore nell'analisi AI
-            current_app.logger.error(f"Errore nell'analisi AI per autista {driver_id}: {e}")
-        
-        # Fallback ai dati mock
-        current_app.logger.info(f"Utilizzo dati mock per autista {driver_id}")
-        emotion_data = MonitoringService.generate_emotion_data()
-        
-        return jsonify({
-            'success': True,
-            'data': emotion_data
-        })
+            return jsonify({
+                'success': True,
+                'data': response_data
+            })
+        else:
+            # Analisi AI fallita, usa fallback
+            current_app.logger.info(f"Analisi AI fallita per autista {driver_id}, uso fallback mock")
+            
+    except ImportError as e:
+        # Modulo AI non disponibile
+        current_app.logger.warning(f"Modulo AI non disponibile: {e}")
         
     except Exception as e:
-        current_app.logger.error(f"Errore nell'analisi del frame per autista {driver_id}: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Errore nell\'analisi del frame'
-        }), 500
+        # Errore nell'analisi AI
+        current_app.logger.error(f"Errore nell'analisi AI per autista {driver_id}: {e}")
+    
+    # Fallback ai dati mock
+    current_app.logger.info(f"Utilizzo dati mock per autista {driver_id}")
+    emotion_data = MonitoringService.generate_emotion_data()
+    
+    return jsonify({
+        'success': True,
+        'data': emotion_data
+    })
 
 # ========================
 # ERROR HANDLERS
@@ -752,26 +799,18 @@ def api_analyze_emotion_frame(driver_id):
 @main_bp.errorhandler(404)
 def not_found_error(error):
     """Handle 404 errors by returning a JSON response for API calls or HTML for page requests."""
-    if request.path.startswith('/api/'):
-        return jsonify({
-            'success': False,
-            'error': 'Endpoint non trovato'
-        }), 404
-    else:
-        return render_template('error.html', 
-                             error_message="Pagina non trovata"), 404
+    if current_app.config['API_ONLY_MODE'] or request.path.startswith(_API_PREFIX):
+        return _API_NOT_FOUND()
+    return render_template('error.html', 
+                         error_message="Pagina non trovata"), 404
 
 @main_bp.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors by returning appropriate responses."""
-    if request.path.startswith('/api/'):
-        return jsonify({
-            'success': False,
-            'error': 'Errore interno del server'
-        }), 500
-    else:
-        return render_template('error.html', 
-                             error_message="Errore interno del server"), 500
+    if current_app.config['API_ONLY_MODE'] or request.path.startswith(_API_PREFIX):
+        return _API_INTERNAL_ERROR()
+    return render_template('error.html', 
+                         error_message="Errore interno del server"), 500
 
 # ========================
 # UTILITY ENDPOINTS
@@ -785,17 +824,37 @@ def api_health_check():
     Returns:
         Response: JSON response indicating application health
     """
+    return _HEALTHY()
+
+@main_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Readiness endpoint reporting whether the emotion detection model has been loaded.
+    
+    Returns:
+        Response: JSON response with application and model status
+    """
+    try:
+        from app.ai.emotion_detector import is_model_loaded
+        model_loaded = is_model_loaded()
+    except ImportError:
+        model_loaded = False
+    
     return jsonify({
         'success': True,
         'status': 'healthy',
-        'message': 'Driver Management System is running'
+        'modelLoaded': model_loaded
     })
 
 @main_bp.route('/favicon.ico')
 def favicon():
-    """Serve favicon.ico file."""
-    return send_from_directory(
-        os.path.join(current_app.root_path, '../static'),
+    """Serve favicon.ico file with a far-future Cache-Control so browsers stop re-requesting it."""
+    response = send_from_directory(
+        _FAVICON_DIR,
         'favicon.ico',
-        mimetype='image/vnd.microsoft.icon'
-    )
\ No newline at end of file
+        mimetype='image/vnd.microsoft.icon',
+        max_age=31536000
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
\ No newline at end of file
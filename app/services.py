@@ -9,17 +9,54 @@ Author: Schumi Development Team
 Date: 2024
 """
 
+import functools
+import itertools
 import os
 import random
+import threading
 import time
-import csv
-from typing import List, Dict, Optional, Tuple
+import uuid
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, namedtuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from werkzeug.utils import secure_filename
 from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, selectinload
 
 from . import db
-from .models import Driver, Classification, MonitoringStatus, SimulationData, ClassificationResult
+from .models import (Driver, Classification, MonitoringStatus, SimulationData, ClassificationResult,
+                     MonitoringSession)
 from .config import Config
+from .utils import CSVUtils
+
+# Unbound method, as in models: saves an attribute lookup per timestamp
+_ISO = datetime.isoformat
+
+# Immutable view of a driver's identity, safe to keep across requests (no ORM session)
+DriverSummary = namedtuple('DriverSummary', ['id', 'first_name', 'last_name'])
+
+# Nested objects that can be embedded in the drivers list (?include=...)
+DRIVER_INCLUDES = frozenset({'classification', 'monitoring'})
+
+# Per-thread random generators for the simulated monitoring data
+_monitoring_rng = threading.local()
+
+class ValidationError(ValueError):
+    """
+    Invalid input or missing resource reported by a service.
+    
+    The API maps only this error to a 400 carrying its message: any other
+    exception, including a plain ValueError from library code, is an internal
+    error and is never echoed back to the client.
+    """
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_name(name: str) -> str:
+    """Strip and title-case a driver name (cached: the same names come back on every edit)."""
+    return name.strip().title()
 
 class DriverService:
     """
@@ -29,28 +66,286 @@ class DriverService:
     including CRUD operations, validation, and data processing.
     """
     
+    # driver_id -> (expiry time, DriverSummary), in LRU order; invalidated on rename/delete
+    _summary_cache: 'OrderedDict[int, Tuple[float, DriverSummary]]' = OrderedDict()
+    # driver_id -> (expiry time, Driver.to_dict()), in LRU order; invalidated on every driver write
+    _data_cache: 'OrderedDict[int, Tuple[float, Dict]]' = OrderedDict()
+    _cache_lock = threading.Lock()
+    
     @staticmethod
-    def get_all_drivers() -> List[Driver]:
+    def get_all_drivers(include_history: bool = False) -> List[Driver]:
         """
         Retrieve all drivers from the database.
         
+        Args:
+            include_history (bool): Also load classification results and monitoring
+                sessions (one extra SELECT per relationship, not per driver)
+        
         Returns:
             List[Driver]: List of all driver objects
         """
-        return Driver.query.order_by(Driver.created_at.desc()).all()
+        query = Driver.query.order_by(Driver.created_at.desc(), Driver.id.desc())
+        if include_history:
+            query = query.options(
+                selectinload(Driver.classification_results),
+                selectinload(Driver.monitoring_sessions)
+            )
+        return query.all()
+    
+    @staticmethod
+    def get_all_drivers_data(includes: frozenset = frozenset()) -> List[Dict]:
+        """
+        Retrieve all drivers already serialized as dictionaries.
+        
+        Selects only the needed columns as plain rows, skipping ORM instance
+        construction and the identity map; the output matches Driver.to_dict.
+        
+        With includes, each driver also carries its latest classification
+        result ('lastClassification') and/or latest monitoring session
+        ('lastMonitoringSession'), or None. Each include costs one extra
+        SELECT for the whole list, so a dashboard gets everything it renders
+        in a single request instead of one monitor/classify call per driver.
+        
+        Args:
+            includes (frozenset): Subset of DRIVER_INCLUDES
+        
+        Returns:
+            List[Dict]: Driver dictionaries, newest first
+        """
+        return list(DriverService.iter_all_drivers_data(includes))
+    
+    @staticmethod
+    def iter_all_drivers_data(includes: frozenset = frozenset(), chunk_size: int = 500) -> Iterator[Dict]:
+        """
+        Lazily yield the dictionaries of get_all_drivers_data.
+        
+        Rows are fetched from the cursor chunk_size at a time (yield_per), so a
+        caller streaming the list keeps only one chunk in memory.
+        
+        Args:
+            includes (frozenset): Subset of DRIVER_INCLUDES
+            chunk_size (int): Rows fetched per round-trip
+        
+        Yields:
+            Dict: Driver dictionaries, newest first
+        """
+        latest_classification = (DriverService._latest_per_driver(ClassificationResult)
+                                 if 'classification' in includes else None)
+        latest_session = (DriverService._latest_per_driver(MonitoringSession)
+                          if 'monitoring' in includes else None)
+        
+        result = db.session.execute(
+            DriverService._data_select()
+            .order_by(Driver.created_at.desc(), Driver.id.desc())
+            .execution_options(yield_per=chunk_size)
+        )
+        for row in result:
+            data = DriverService._row_to_data(row)
+            if latest_classification is not None:
+                data['lastClassification'] = latest_classification.get(data['id'])
+            if latest_session is not None:
+                data['lastMonitoringSession'] = latest_session.get(data['id'])
+            yield data
+    
+    @staticmethod
+    def _latest_per_driver(model) -> Dict[int, Dict]:
+        """
+        Serialize the most recent row of a per-driver history table for every driver.
+        
+        Args:
+            model: ClassificationResult or MonitoringSession
+            
+        Returns:
+            Dict[int, Dict]: driver_id -> to_dict() of the row with the highest ID
+        """
+        latest_ids = select(func.max(model.id)).group_by(model.driver_id)
+        return {
+            item.driver_id: item.to_dict()
+            for item in db.session.scalars(select(model).where(model.id.in_(latest_ids)))
+        }
+    
+    @staticmethod
+    def get_drivers_fingerprint() -> Tuple:
+        """
+        Cheap summary of the drivers table that changes whenever a driver is
+        added, updated or deleted (any write bumps the latest updated_at).
+        
+        Returns:
+            Tuple: (count, highest ID, latest updated_at)
+        """
+        return tuple(db.session.execute(
+            select(func.count(Driver.id), func.max(Driver.id), func.max(Driver.updated_at))
+        ).one())
+    
+    @staticmethod
+    def get_drivers_page(after_id: int = 0, limit: int = 20) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Retrieve one page of serialized drivers using keyset pagination on the ID.
+        
+        The page is located with an index range scan (id > after_id) instead of
+        OFFSET, so the cost does not grow with the page number, and rows are
+        fetched from the cursor in chunks while being serialized.
+        
+        Args:
+            after_id (int): ID of the last driver of the previous page (0 for the first page)
+            limit (int): Maximum number of drivers in the page
+            
+        Returns:
+            Tuple[List[Dict], Optional[int]]: Driver dictionaries ordered by ID and
+            the cursor for the next page (None on the last page)
+        """
+        result = db.session.execute(
+            DriverService._data_select()
+            .where(Driver.id > after_id)
+            .order_by(Driver.id)
+            .limit(limit + 1)
+            .execution_options(yield_per=500)
+        )
+        drivers_data = [DriverService._row_to_data(row) for row in result]
+        
+        # One extra row tells whether another page exists
+        if len(drivers_data) > limit:
+            drivers_data.pop()
+            return drivers_data, drivers_data[-1]['id']
+        return drivers_data, None
+    
+    @staticmethod
+    def _data_select():
+        """Column select behind the serialized driver listings."""
+        return select(Driver.id, Driver.first_name, Driver.last_name, Driver.classification,
+                      Driver.monitoring_status, Driver.simulation_file,
+                      Driver.created_at, Driver.updated_at)
+    
+    @staticmethod
+    def _row_to_data(row) -> Dict:
+        """
+        Serialize a row of _data_select() like Driver.to_dict.
+        
+        The row is unpacked as a plain tuple: Row attribute access by column
+        name costs a key lookup per field, several times the dict build itself
+        on long lists.
+        """
+        (driver_id, first_name, last_name, classification, monitoring_status,
+         simulation_file, created_at, updated_at) = row
+        return {
+            'id': driver_id,
+            'firstName': first_name,
+            'lastName': last_name,
+            'classification': classification,
+            'monitoringStatus': monitoring_status,
+            'simulationFile': simulation_file,
+            'createdAt': _ISO(created_at) if created_at else None,
+            'updatedAt': _ISO(updated_at) if updated_at else None
+        }
     
     @staticmethod
-    def get_driver_by_id(driver_id: int) -> Optional[Driver]:
+    def get_driver_by_id(driver_id: int, name_only: bool = False) -> Optional[Driver]:
         """
         Retrieve a specific driver by their ID.
         
+        Uses the session identity map first, so a driver already loaded in the
+        current request costs no SQL round-trip.
+        
         Args:
             driver_id (int): The unique identifier of the driver
+            name_only (bool): Load only the name columns (pages that just render the name)
             
         Returns:
             Optional[Driver]: Driver object if found, None otherwise
         """
-        return Driver.query.get(driver_id)
+        if name_only:
+            return db.session.get(Driver, driver_id,
+                                  options=[load_only(Driver.first_name, Driver.last_name)])
+        return db.session.get(Driver, driver_id)
+    
+    @staticmethod
+    def get_driver_summary(driver_id: int) -> Optional[DriverSummary]:
+        """
+        Retrieve a driver's ID and name through a short-lived in-process cache.
+        
+        Pages that only render the name (e.g. the monitoring page, reloaded on
+        every reconnect) and the polling endpoints that only need to know the
+        driver exists skip the database while the entry is fresh. Entries
+        expire after DRIVER_CACHE_TTL seconds, which bounds staleness across
+        worker processes; in this process they are dropped on rename/delete.
+        At most DRIVER_CACHE_MAX_SIZE drivers are kept, least recently used
+        evicted first.
+        
+        Args:
+            driver_id (int): The unique identifier of the driver
+            
+        Returns:
+            Optional[DriverSummary]: Driver summary if found, None otherwise
+        """
+        summary = DriverService._cache_lookup(DriverService._summary_cache, driver_id)
+        if summary is not None:
+            return summary
+        
+        driver = DriverService.get_driver_by_id(driver_id, name_only=True)
+        if not driver:
+            return None
+        
+        summary = DriverSummary(driver.id, driver.first_name, driver.last_name)
+        DriverService._cache_store(DriverService._summary_cache, driver_id, summary,
+                                   current_app.config['DRIVER_CACHE_TTL'])
+        return summary
+    
+    @staticmethod
+    def get_driver_data(driver_id: int) -> Optional[Dict]:
+        """
+        Retrieve a driver's serialized data (Driver.to_dict()) through an in-process cache.
+        
+        For read-only endpoints (driver detail, monitoring data) that would
+        otherwise load the row on every poll. Every write in this module drops
+        the entry; entries also expire after DRIVER_DATA_CACHE_TTL seconds,
+        which bounds staleness across worker processes. The returned dict is
+        shared with the cache and must not be modified.
+        
+        Args:
+            driver_id (int): The unique identifier of the driver
+            
+        Returns:
+            Optional[Dict]: Driver data if found, None otherwise
+        """
+        data = DriverService._cache_lookup(DriverService._data_cache, driver_id)
+        if data is not None:
+            return data
+        
+        driver = DriverService.get_driver_by_id(driver_id)
+        if not driver:
+            return None
+        
+        data = driver.to_dict()
+        DriverService._cache_store(DriverService._data_cache, driver_id, data,
+                                   current_app.config['DRIVER_DATA_CACHE_TTL'])
+        return data
+    
+    @staticmethod
+    def _cache_lookup(cache: OrderedDict, driver_id: int):
+        """Return a fresh cached value (marking it recently used), or None."""
+        with DriverService._cache_lock:
+            entry = cache.get(driver_id)
+            if entry is not None and entry[0] > time.monotonic():
+                cache.move_to_end(driver_id)
+                return entry[1]
+        return None
+    
+    @staticmethod
+    def _cache_store(cache: OrderedDict, driver_id: int, value, ttl: float) -> None:
+        """Cache a value for ttl seconds, evicting least recently used entries past DRIVER_CACHE_MAX_SIZE."""
+        with DriverService._cache_lock:
+            cache[driver_id] = (time.monotonic() + ttl, value)
+            cache.move_to_end(driver_id)
+            while len(cache) > current_app.config['DRIVER_CACHE_MAX_SIZE']:
+                cache.popitem(last=False)
+    
+    @staticmethod
+    def _invalidate_driver_cache(*driver_ids: int) -> None:
+        """Drop cached summaries and data of drivers that were just written."""
+        with DriverService._cache_lock:
+            for driver_id in driver_ids:
+                DriverService._summary_cache.pop(driver_id, None)
+                DriverService._data_cache.pop(driver_id, None)
     
     @staticmethod
     def create_driver(first_name: str, last_name: str, simulation_file=None) -> Driver:
@@ -66,32 +361,28 @@ class DriverService:
             Driver: The newly created driver object
             
         Raises:
-            ValueError: If required fields are missing or invalid
+            ValidationError: If required fields are missing or invalid
         """
         # Validate input parameters
         if not first_name or not first_name.strip():
-            raise ValueError("Il nome è obbligatorio")
+            raise ValidationError("Il nome è obbligatorio")
         
         if not last_name or not last_name.strip():
-            raise ValueError("Il cognome è obbligatorio")
+            raise ValidationError("Il cognome è obbligatorio")
         
         # Clean and validate names
-        first_name = first_name.strip().title()
-        last_name = last_name.strip().title()
-        
-        # Check for duplicate drivers (same first and last name)
-        existing_driver = Driver.query.filter_by(
-            first_name=first_name, 
-            last_name=last_name
-        ).first()
+        first_name = _normalize_name(first_name)
+        last_name = _normalize_name(last_name)
         
-        if existing_driver:
-            raise ValueError(f"Un autista con nome {first_name} {last_name} esiste già")
+        # Duplicate drivers (same first and last name) are rejected by the
+        # unique name index on commit: no SELECT beforehand, and no race
+        # between check and insert
         
         # Handle simulation file upload if provided
         simulation_filename = None
+        data_points = None
         if simulation_file:
-            simulation_filename = FileUploadService.save_simulation_file(
+            simulation_filename, data_points = FileUploadService.save_simulation_file_counted(
                 simulation_file, first_name, last_name
             )
         
@@ -104,13 +395,17 @@ class DriverService:
         
         # Save to database
         db.session.add(new_driver)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if simulation_filename:
+                FileUploadService.delete_simulation_file(simulation_filename)
+            raise ValidationError(f"Un autista con nome {first_name} {last_name} esiste già")
         
         # Process simulation data if file was uploaded
         if simulation_file and simulation_filename:
-            SimulationDataService.process_simulation_file(
-                new_driver.id, simulation_filename
-            )
+            SimulationDataService.schedule_processing(new_driver.id, simulation_filename, data_points)
         
         return new_driver
     
@@ -127,17 +422,43 @@ class DriverService:
             Driver: Updated driver object
             
         Raises:
-            ValueError: If driver not found
+            ValidationError: If driver not found
         """
-        driver = Driver.query.get(driver_id)
+        driver = db.session.get(Driver, driver_id)
         if not driver:
-            raise ValueError(f"Autista con ID {driver_id} non trovato")
+            raise ValidationError(f"Autista con ID {driver_id} non trovato")
         
         driver.update_monitoring_status(new_status)
         db.session.commit()
+        DriverService._invalidate_driver_cache(driver_id)
         
         return driver
     
+    @staticmethod
+    def set_monitoring_status(driver_id: int, new_status: MonitoringStatus) -> bool:
+        """
+        Set a driver's monitoring status with a single UPDATE, without loading the row.
+        
+        updated_at is refreshed by the column's onupdate default. Drivers already
+        loaded in the current session are not synchronized.
+        
+        Args:
+            driver_id (int): ID of the driver to update
+            new_status (MonitoringStatus): New monitoring status
+            
+        Returns:
+            bool: True if the driver exists (and was updated), False otherwise
+        """
+        result = db.session.execute(
+            update(Driver)
+            .where(Driver.id == driver_id)
+            .values(monitoring_status=new_status.value)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        DriverService._invalidate_driver_cache(driver_id)
+        return result.rowcount > 0
+    
     @staticmethod
     def delete_driver(driver_id: int) -> bool:
         """
@@ -149,16 +470,24 @@ class DriverService:
         Returns:
             bool: True if deletion was successful, False if driver not found
         """
-        driver = Driver.query.get(driver_id)
-        if not driver:
+        # Only the file name is needed: no Driver instance and no loading of
+        # its collections just to cascade the delete
+        row = db.session.execute(
+            select(Driver.simulation_file).where(Driver.id == driver_id)
+        ).first()
+        if row is None:
             return False
         
         # Delete associated simulation file if it exists
-        if driver.simulation_file:
-            FileUploadService.delete_simulation_file(driver.simulation_file)
+        if row.simulation_file:
+            FileUploadService.delete_simulation_file(row.simulation_file)
         
-        db.session.delete(driver)
+        # Dependent rows first (bulk DELETEs bypass the ORM cascade), then the driver
+        for model in (ClassificationResult, MonitoringSession, SimulationData):
+            db.session.execute(delete(model).where(model.driver_id == driver_id))
+        db.session.execute(delete(Driver).where(Driver.id == driver_id))
         db.session.commit()
+        DriverService._invalidate_driver_cache(driver_id)
         
         return True
     
@@ -177,51 +506,41 @@ class DriverService:
             Driver: Updated driver object
             
         Raises:
-            ValueError: If driver not found or invalid data provided
+            ValidationError: If driver not found or invalid data provided
         """
-        driver = Driver.query.get(driver_id)
+        driver = db.session.get(Driver, driver_id)
         if not driver:
-            raise ValueError(f"Autista con ID {driver_id} non trovato")
+            raise ValidationError(f"Autista con ID {driver_id} non trovato")
         
         # Update names if provided
         if first_name is not None:
-            first_name = first_name.strip().title()
+            first_name = _normalize_name(first_name)
             if not first_name:
-                raise ValueError("Il nome non può essere vuoto")
+                raise ValidationError("Il nome non può essere vuoto")
             if len(first_name) < 2:
-                raise ValueError("Il nome deve contenere almeno 2 caratteri")
-            
-            # Check for duplicate drivers (excluding current driver)
-            existing_driver = Driver.query.filter(
-                Driver.first_name == first_name,
-                Driver.last_name == (last_name.strip().title() if last_name else driver.last_name),
-                Driver.id != driver_id
-            ).first()
-            
-            if existing_driver:
-                raise ValueError(f"Un autista con nome {first_name} {last_name or driver.last_name} esiste già")
+                raise ValidationError("Il nome deve contenere almeno 2 caratteri")
             
             driver.first_name = first_name
         
         if last_name is not None:
-            last_name = last_name.strip().title()
+            last_name = _normalize_name(last_name)
             if not last_name:
-                raise ValueError("Il cognome non può essere vuoto")
+                raise ValidationError("Il cognome non può essere vuoto")
             if len(last_name) < 2:
-                raise ValueError("Il cognome deve contenere almeno 2 caratteri")
-            
-            # Check for duplicate drivers (excluding current driver)
-            existing_driver = Driver.query.filter(
-                Driver.first_name == (first_name.strip().title() if first_name else driver.first_name),
-                Driver.last_name == last_name,
-                Driver.id != driver_id
-            ).first()
-            
-            if existing_driver:
-                raise ValueError(f"Un autista con nome {first_name or driver.first_name} {last_name} esiste già")
+                raise ValidationError("Il cognome deve contenere almeno 2 caratteri")
             
             driver.last_name = last_name
         
+        # Send the rename now: a duplicate name is rejected by the unique index
+        # before the old simulation file is touched
+        if first_name is not None or last_name is not None:
+            full_name = driver.get_full_name()
+            try:
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                raise ValidationError(f"Un autista con nome {full_name} esiste già")
+        
         # Handle simulation file replacement if provided
         if simulation_file:
             # Delete old file if it exists
@@ -229,15 +548,17 @@ class DriverService:
                 FileUploadService.delete_simulation_file(driver.simulation_file)
             
             # Save new file
-            simulation_filename = FileUploadService.save_simulation_file(
+            simulation_filename, data_points = FileUploadService.save_simulation_file_counted(
                 simulation_file, driver.first_name, driver.last_name
             )
             driver.simulation_file = simulation_filename
-            
-            # Process new simulation data
-            SimulationDataService.process_simulation_file(driver.id, simulation_filename)
         
         db.session.commit()
+        
+        # Process new simulation data (after the commit: it may run in a worker thread)
+        if simulation_file:
+            SimulationDataService.schedule_processing(driver.id, driver.simulation_file, data_points)
+        DriverService._invalidate_driver_cache(driver_id)
         return driver
 
 class ClassificationService:
@@ -255,9 +576,16 @@ class ClassificationService:
         Classification.EFFICIENT: 0.4,
         Classification.EXPERT: 0.3
     }
+    # Data points at which the simulated confidence is halfway between 0.75 and 0.95
+    CONFIDENCE_HALF_POINTS = 1000
+    
+    # Population and cumulative weights for random.choices, computed once
+    _CLASSIFICATION_POPULATION = tuple(CLASSIFICATION_WEIGHTS.keys())
+    _CLASSIFICATION_CUM_WEIGHTS = tuple(itertools.accumulate(CLASSIFICATION_WEIGHTS.values()))
     
     @staticmethod
-    def classify_driver(driver_id: int) -> Tuple[Classification, float]:
+    def classify_driver(driver_id: int, driver: Optional[Driver] = None,
+                        data_points: Optional[int] = None) -> Tuple[Classification, float]:
         """
         Classify a driver based on their simulation data.
         
@@ -267,44 +595,157 @@ class ClassificationService:
         
         Args:
             driver_id (int): ID of the driver to classify
+            driver (Driver, optional): The driver, when the caller already loaded it
+                together with data_points through get_driver_with_data_points
+            data_points (int, optional): Data points of the driver's current simulation
+                file (only used with driver)
             
         Returns:
             Tuple[Classification, float]: Classification result and confidence score
             
         Raises:
-            ValueError: If driver not found or no simulation data available
+            ValidationError: If driver not found or no simulation data available
         """
-        driver = Driver.query.get(driver_id)
+        if driver is None:
+            driver, data_points = ClassificationService.get_driver_with_data_points(driver_id)
         if not driver:
-            raise ValueError(f"Autista con ID {driver_id} non trovato")
+            raise ValidationError(f"Autista con ID {driver_id} non trovato")
         
         if not driver.simulation_file:
-            raise ValueError("Nessun file di simulazione trovato per questo autista")
-        
-        # Simulate processing delay (real ML would take time)
-        time.sleep(random.uniform(1.5, 3.0))
+            raise ValidationError("Nessun file di simulazione trovato per questo autista")
         
         # Simulate classification logic
         # In real implementation, this would analyze CSV data
         classification = ClassificationService._simulate_classification_analysis()
-        confidence_score = random.uniform(0.75, 0.95)  # High confidence simulation
-        
-        # Update driver's classification
-        old_classification = driver.classification
-        driver.update_classification(classification)
-        
-        # Create classification result record
-        result = ClassificationResult(
-            driver_id=driver_id,
-            old_classification=old_classification,
-            new_classification=classification,
-            confidence_score=confidence_score
-        )
-        db.session.add(result)
+        confidence_score = ClassificationService._confidence_score(data_points)
+        
+        # Update driver's classification and record the change
+        result_row = driver.update_classification(classification, confidence_score)
+        ClassificationService.record_classification_results([result_row])
         db.session.commit()
+        # driver_id, not driver.id: the commit expired the instance and reading it would reload the row
+        DriverService._invalidate_driver_cache(driver_id)
         
         return classification, confidence_score
     
+    @staticmethod
+    def get_driver_with_data_points(driver_id: int) -> Tuple[Optional[Driver], Optional[int]]:
+        """
+        Load a driver and the data points of its current simulation file in one SELECT.
+        
+        Args:
+            driver_id (int): ID of the driver
+            
+        Returns:
+            Tuple[Optional[Driver], Optional[int]]: The driver (None if not found) and its
+            data points (None if the file has not been processed yet)
+        """
+        data_points = ClassificationService._data_points_query()
+        row = db.session.execute(
+            select(Driver, data_points.scalar_subquery()).where(Driver.id == driver_id)
+        ).first()
+        return (row[0], row[1]) if row is not None else (None, None)
+    
+    @staticmethod
+    def classify_drivers(driver_ids: List[int]) -> Dict[int, Tuple[Classification, float]]:
+        """
+        Classify several drivers in one transaction.
+        
+        The drivers are read with a single SELECT, the classification columns are
+        written with one UPDATE per distinct classification (at most three) and the
+        history rows with one executemany INSERT, followed by a single commit.
+        Drivers that do not exist or have no simulation file are skipped. Drivers
+        already loaded in the current session are not synchronized.
+        
+        Args:
+            driver_ids (List[int]): IDs of the drivers to classify
+            
+        Returns:
+            Dict[int, Tuple[Classification, float]]: Classification and confidence score by driver ID
+        """
+        if not driver_ids:
+            return {}
+        
+        data_points = ClassificationService._data_points_query()
+        rows = db.session.execute(
+            select(Driver.id, Driver.classification, data_points.scalar_subquery())
+            .where(Driver.id.in_(set(driver_ids)), Driver.simulation_file.isnot(None))
+        ).all()
+        
+        results = {}
+        history = []
+        ids_by_classification = {}
+        for driver_id, old_classification, points in rows:
+            classification = ClassificationService._simulate_classification_analysis()
+            confidence_score = ClassificationService._confidence_score(points)
+            results[driver_id] = (classification, confidence_score)
+            ids_by_classification.setdefault(classification, []).append(driver_id)
+            history.append({
+                'driver_id': driver_id,
+                'old_classification': Classification(old_classification),
+                'new_classification': classification,
+                'confidence_score': confidence_score
+            })
+        
+        # updated_at is refreshed by the column's onupdate default
+        for classification, ids in ids_by_classification.items():
+            db.session.execute(
+                update(Driver)
+                .where(Driver.id.in_(ids))
+                .values(classification=classification.value)
+                .execution_options(synchronize_session=False)
+            )
+        ClassificationService.record_classification_results(history)
+        db.session.commit()
+        DriverService._invalidate_driver_cache(*results)
+        
+        return results
+    
+    @staticmethod
+    def record_classification_results(rows: List[Dict]) -> None:
+        """
+        Insert classification history rows with a single executemany INSERT.
+        
+        SQLAlchemy batches the rows into multi-VALUES statements (insertmanyvalues),
+        so reclassifying many drivers costs one round-trip per page instead of one
+        per driver. The caller is responsible for committing.
+        
+        Args:
+            rows (List[Dict]): Rows as returned by Driver.update_classification
+        """
+        if rows:
+            db.session.execute(insert(ClassificationResult), rows)
+    
+    @staticmethod
+    def _data_points_query():
+        """
+        SELECT of the data points of a driver's current simulation file,
+        correlated to the Driver row of the enclosing query.
+        """
+        return (select(SimulationData.data_points)
+                .where(SimulationData.driver_id == Driver.id,
+                       SimulationData.file_path == Driver.simulation_file)
+                .order_by(SimulationData.id.desc())
+                .limit(1))
+    
+    @staticmethod
+    def _confidence_score(data_points: Optional[int]) -> float:
+        """
+        Deterministic simulated confidence: grows with the simulation's data points.
+        
+        From 0.75 for an empty (or not yet processed) log towards 0.95, reaching
+        0.85 at CONFIDENCE_HALF_POINTS points.
+        
+        Args:
+            data_points (int, optional): Data lines of the simulation CSV
+            
+        Returns:
+            float: Confidence score between 0.75 and 0.95
+        """
+        points = data_points or 0
+        half = ClassificationService.CONFIDENCE_HALF_POINTS
+        return 0.75 + 0.2 * points / (points + half)
+    
     @staticmethod
     def _simulate_classification_analysis() -> Classification:
         """
@@ -316,25 +757,30 @@ class ClassificationService:
         Returns:
             Classification: Randomly selected classification
         """
-        classifications = list(ClassificationService.CLASSIFICATION_WEIGHTS.keys())
-        weights = list(ClassificationService.CLASSIFICATION_WEIGHTS.values())
-        
-        return random.choices(classifications, weights=weights)[0]
+        return random.choices(ClassificationService._CLASSIFICATION_POPULATION,
+                              cum_weights=ClassificationService._CLASSIFICATION_CUM_WEIGHTS)[0]
     
     @staticmethod
-    def get_classification_history(driver_id: int) -> List[ClassificationResult]:
+    def get_classification_history(driver_id: int, limit: Optional[int] = None) -> List[ClassificationResult]:
         """
         Get the classification history for a driver.
         
+        Served by the (driver_id, classified_at) index, newest first; pass
+        limit to read only the most recent entries instead of the whole history.
+        
         Args:
             driver_id (int): ID of the driver
+            limit (int, optional): Maximum number of results
             
         Returns:
             List[ClassificationResult]: List of classification results ordered by date
         """
-        return ClassificationResult.query.filter_by(driver_id=driver_id)\
-                                       .order_by(ClassificationResult.classified_at.desc())\
-                                       .all()
+        query = (select(ClassificationResult)
+                 .where(ClassificationResult.driver_id == driver_id)
+                 .order_by(ClassificationResult.classified_at.desc()))
+        if limit is not None:
+            query = query.limit(limit)
+        return db.session.scalars(query).all()
 
 class SimulationDataService:
     """
@@ -344,49 +790,98 @@ class SimulationDataService:
     uploaded by users for driver classification.
     """
     
+    # Worker pool for background CSV processing, created on first use
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+    
     @staticmethod
-    def process_simulation_file(driver_id: int, filename: str) -> SimulationData:
+    def schedule_processing(driver_id: int, filename: str, data_points: Optional[int] = None) -> bool:
+        """
+        Process a saved simulation file, in a background thread when enabled.
+        
+        With SIMULATION_PROCESS_ASYNC the request only pays for the upload and
+        the disk write: the CSV is analyzed by a worker of a small thread pool
+        (SIMULATION_WORKERS threads) inside its own application context, and
+        the SimulationData row appears once it is done.
+        
+        Args:
+            driver_id (int): ID of the associated driver
+            filename (str): Name of the saved simulation file
+            data_points (int, optional): Data lines already counted while saving the upload
+            
+        Returns:
+            bool: True if processing was deferred to the background
+        """
+        if not current_app.config['SIMULATION_PROCESS_ASYNC']:
+            SimulationDataService.process_simulation_file(driver_id, filename, data_points)
+            return False
+        
+        with SimulationDataService._executor_lock:
+            if SimulationDataService._executor is None:
+                SimulationDataService._executor = ThreadPoolExecutor(
+                    max_workers=current_app.config['SIMULATION_WORKERS'],
+                    thread_name_prefix='simulation-csv'
+                )
+        
+        app = current_app._get_current_object()
+        
+        def _worker():
+            with app.app_context():
+                SimulationDataService.process_simulation_file(driver_id, filename, data_points)
+        
+        SimulationDataService._executor.submit(_worker)
+        return True
+    
+    @staticmethod
+    def process_simulation_file(driver_id: int, filename: str, data_points: Optional[int] = None) -> Optional[SimulationData]:
         """
         Process a simulation CSV file and extract relevant data.
         
         Args:
             driver_id (int): ID of the associated driver
             filename (str): Name of the simulation file
+            data_points (int, optional): Data lines counted while saving the upload;
+                when given, the file is not read again
             
         Returns:
-            SimulationData: Processed simulation data object
+            Optional[SimulationData]: Processed simulation data object, or None if the
+            driver was deleted in the meantime (nothing is stored)
         """
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        file_path = os.path.join(current_app.upload_folder, filename)
         
+        # Only the analysis can fail here (it touches no database state); on error
+        # a basic record with the column defaults is stored instead
         try:
-            # Analyze CSV file
-            data_points, duration, avg_speed = SimulationDataService._analyze_csv_file(file_path)
-            
-            # Create simulation data record
-            sim_data = SimulationData(
-                driver_id=driver_id,
-                file_path=filename,
-                data_points=data_points,
-                duration=duration,
-                average_speed=avg_speed
-            )
-            
-            db.session.add(sim_data)
-            db.session.commit()
-            
-            return sim_data
-            
+            # Analyze CSV file (or just derive the metrics from the count taken on upload)
+            if data_points is None:
+                data_points, duration, avg_speed = SimulationDataService._analyze_csv_file(file_path)
+            else:
+                duration, avg_speed = SimulationDataService._simulate_metrics(data_points)
+            metrics = {'data_points': data_points, 'duration': duration, 'average_speed': avg_speed}
         except Exception as e:
             current_app.logger.error(f"Error processing simulation file {filename}: {str(e)}")
-            # Create basic record even if processing fails
-            sim_data = SimulationData(
-                driver_id=driver_id,
-                file_path=filename
-            )
-            db.session.add(sim_data)
+            metrics = {}
+        
+        # A background job can outlive its driver: re-check it in the same transaction
+        # as the insert (FOR UPDATE holds off a concurrent delete where supported)
+        driver_exists = db.session.scalar(
+            select(Driver.id).where(Driver.id == driver_id).with_for_update()
+        )
+        if driver_exists is None:
+            db.session.rollback()
+            current_app.logger.info(f"Driver {driver_id} deleted before {filename} was processed, skipping")
+            return None
+        
+        # Create simulation data record (single commit path)
+        sim_data = SimulationData(driver_id=driver_id, file_path=filename, **metrics)
+        db.session.add(sim_data)
+        try:
             db.session.commit()
-            
-            return sim_data
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return sim_data
     
     @staticmethod
     def _analyze_csv_file(file_path: str) -> Tuple[int, float, float]:
@@ -400,26 +895,34 @@ class SimulationDataService:
             Tuple[int, float, float]: Data points count, duration, average speed
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.reader(file)
-                
-                # Skip header if present
-                header = next(csv_reader, None)
-                
-                # Count data points and simulate analysis
-                data_points = sum(1 for row in csv_reader)
-                
-                # Simulate duration and speed calculation
-                # In real implementation, these would be calculated from actual CSV data
-                duration = data_points * random.uniform(0.1, 0.5)  # Seconds per data point
-                avg_speed = random.uniform(30, 80)  # km/h
+            with open(file_path, 'rb') as file:
+                # Count data points (header excluded) reading the file in chunks
+                data_points = CSVUtils.count_data_lines(file)
                 
+                duration, avg_speed = SimulationDataService._simulate_metrics(data_points)
                 return data_points, duration, avg_speed
                 
         except Exception as e:
             current_app.logger.warning(f"Could not analyze CSV file {file_path}: {str(e)}")
             # Return default values if analysis fails
             return 0, 0.0, 0.0
+    
+    @staticmethod
+    def _simulate_metrics(data_points: int) -> Tuple[float, float]:
+        """
+        Simulate duration and average speed for a simulation log.
+        
+        In real implementation, these would be calculated from actual CSV data.
+        
+        Args:
+            data_points (int): Number of data lines in the CSV
+            
+        Returns:
+            Tuple[float, float]: Duration (seconds) and average speed (km/h)
+        """
+        duration = data_points * random.uniform(0.1, 0.5)  # Seconds per data point
+        avg_speed = random.uniform(30, 80)  # km/h
+        return duration, avg_speed
 
 class FileUploadService:
     """
@@ -442,30 +945,103 @@ class FileUploadService:
             str: Saved filename
             
         Raises:
-            ValueError: If file is invalid or upload fails
+            ValidationError: If file is invalid or upload fails
+        """
+        return FileUploadService.save_simulation_file_counted(file, first_name, last_name)[0]
+    
+    @staticmethod
+    def save_simulation_file_counted(file, first_name: str, last_name: str) -> Tuple[str, int]:
+        """
+        Save an uploaded simulation file and count its data lines on the way.
+        
+        Newlines are counted while saving (on the chunks written by the copy
+        loop, or on the freshly written file right after sendfile, while it is
+        still in the page cache), so processing the CSV afterwards does not need
+        to read the file again.
+        
+        Args:
+            file (FileStorage): Uploaded file object
+            first_name (str): Driver's first name for filename generation
+            last_name (str): Driver's last name for filename generation
+            
+        Returns:
+            Tuple[str, int]: Saved filename and data lines (header excluded)
+            
+        Raises:
+            ValidationError: If file is invalid or upload fails
         """
         if not file or not file.filename:
-            raise ValueError("Nessun file selezionato")
+            raise ValidationError("Nessun file selezionato")
         
         # Validate file extension
         if not Config.validate_file_extension(file.filename):
-            raise ValueError("Solo file CSV sono permessi")
+            raise ValidationError("Solo file CSV sono permessi")
+        
+        # Generate secure filename (one secure_filename pass over the whole slug;
+        # the random suffix also keeps two uploads in the same second apart)
+        safe_slug = secure_filename(f"{first_name.lower()}_{last_name.lower()}")
+        filename = f"sim_{safe_slug}_{uuid.uuid4().hex[:12]}.csv"
+        
+        # Save file (the upload directory is created once in create_app)
+        file_path = os.path.join(current_app.upload_folder, filename)
+        with open(file_path, 'w+b') as dst:
+            data_points = FileUploadService._copy_stream(file.stream, dst)
         
-        # Generate secure filename
-        timestamp = int(time.time())
-        safe_first_name = secure_filename(first_name.lower())
-        safe_last_name = secure_filename(last_name.lower())
-        filename = f"sim_{safe_first_name}_{safe_last_name}_{timestamp}.csv"
+        return filename, data_points
+    
+    @staticmethod
+    def _copy_stream(src, dst) -> int:
+        """
+        Copy an upload stream into an open destination file.
         
-        # Ensure upload directory exists
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
+        Uploads backed by a real file (werkzeug spools them to a temporary file,
+        which fileno() rolls over to disk) are copied in-kernel with os.sendfile
+        and the written file is then counted with CSVUtils.count_data_lines (mmap
+        for large files). Streams without a file descriptor (or platforms without
+        sendfile) fall back to a copy loop with a large buffer, which counts the
+        CSV lines of the chunks it writes.
         
-        # Save file
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+        Args:
+            src: Readable upload stream, positioned at the start of the data
+            dst: Destination file opened in binary read/write mode ('w+b')
+            
+        Returns:
+            int: Data lines (header excluded)
+        """
+        start = src.tell()
+        try:
+            src_fd = src.fileno()
+            offset = start
+            remaining = os.fstat(src_fd).st_size - offset
+            dst_fd = dst.fileno()
+            while remaining > 0:
+                sent = os.sendfile(dst_fd, src_fd, offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+        except (AttributeError, OSError, ValueError):
+            # BytesIO has no fd (io.UnsupportedOperation) and sendfile may be
+            # unsupported: rewind both sides so a partial attempt is never kept
+            dst.seek(0)
+            dst.truncate()
+            src.seek(start)
+        else:
+            dst.seek(0)
+            return CSVUtils.count_data_lines(dst)
         
-        return filename
+        # Same counting rules as CSVUtils.count_data_lines
+        buffer_size = current_app.config.get('UPLOAD_COPY_BUFFER_SIZE', 1024 * 1024)
+        read, write = src.read, dst.write
+        lines = 0
+        last_chunk = b''
+        for chunk in iter(lambda: read(buffer_size), b''):
+            write(chunk)
+            lines += chunk.count(b'\n')
+            last_chunk = chunk
+        if last_chunk and not last_chunk.endswith(b'\n'):
+            lines += 1
+        return max(lines - 1, 0)
     
     @staticmethod
     def delete_simulation_file(filename: str) -> bool:
@@ -478,11 +1054,12 @@ class FileUploadService:
         Returns:
             bool: True if deletion was successful, False otherwise
         """
+        # One unlink instead of exists + remove (and no race between the two)
         try:
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
+            os.unlink(os.path.join(current_app.upload_folder, filename))
+            return True
+        except FileNotFoundError:
+            pass
         except Exception as e:
             current_app.logger.error(f"Error deleting file {filename}: {str(e)}")
         
@@ -496,6 +1073,36 @@ class MonitoringService:
     data that would be generated from computer vision analysis.
     """
     
+    # driver_id -> (expiry time, JSON response body), in LRU order bounded like the
+    # driver caches (DRIVER_CACHE_MAX_SIZE); _emotion_data_lock makes concurrent
+    # polls of an expired entry generate it only once
+    _emotion_data_cache: 'OrderedDict[int, Tuple[float, bytes]]' = OrderedDict()
+    _emotion_data_lock = threading.Lock()
+    
+    @staticmethod
+    def get_coalesced_emotion_response(driver_id: int) -> bytes:
+        """
+        Serialized emotion data response for a driver, shared by all polls
+        within EMOTION_DATA_COALESCE_MS.
+        
+        Args:
+            driver_id (int): ID of the driver being monitored
+            
+        Returns:
+            bytes: JSON body {"success": true, "data": {...}}
+        """
+        max_age = current_app.config['EMOTION_DATA_COALESCE_MS'] / 1000.0
+        cache = MonitoringService._emotion_data_cache
+        with MonitoringService._emotion_data_lock:
+            body = DriverService._cache_lookup(cache, driver_id)
+            if body is None:
+                body = current_app.json.dumps({
+                    'success': True,
+                    'data': MonitoringService.generate_emotion_data()
+                }).encode('utf-8')
+                DriverService._cache_store(cache, driver_id, body, max_age)
+        return body
+    
     @staticmethod
     def generate_emotion_data() -> Dict[str, any]:
         """
@@ -507,27 +1114,36 @@ class MonitoringService:
         Returns:
             Dict[str, any]: Emotion data with stress, focus, and calm levels
         """
-        import datetime
+        rng = MonitoringService._thread_rng()
+        uniform = rng.uniform
         
         # Generate realistic emotion values
         # In real implementation, this would come from CV analysis
-        base_stress = random.uniform(10, 30)
-        base_focus = random.uniform(60, 90)
-        base_calm = random.uniform(40, 70)
+        base_stress = uniform(10, 30)
+        base_focus = uniform(60, 90)
+        base_calm = uniform(40, 70)
         
         # Add some natural variation
-        stress = max(0, min(100, base_stress + random.uniform(-5, 5)))
-        focus = max(0, min(100, base_focus + random.uniform(-10, 10)))
-        calm = max(0, min(100, base_calm + random.uniform(-5, 5)))
+        stress = max(0, min(100, base_stress + uniform(-5, 5)))
+        focus = max(0, min(100, base_focus + uniform(-10, 10)))
+        calm = max(0, min(100, base_calm + uniform(-5, 5)))
         
         return {
-            'time': datetime.datetime.now().strftime('%H:%M:%S'),
+            'time': datetime.now().strftime('%H:%M:%S'),
             'stress': round(stress, 1),
             'focus': round(focus, 1),
             'calm': round(calm, 1),
             'timestamp': time.time()
         }
     
+    @staticmethod
+    def _thread_rng() -> random.Random:
+        """Per-thread random.Random, so monitoring threads never share generator state."""
+        rng = getattr(_monitoring_rng, 'random', None)
+        if rng is None:
+            rng = _monitoring_rng.random = random.Random()
+        return rng
+    
     @staticmethod
     def start_monitoring_session(driver_id: int):
         """
@@ -537,15 +1153,11 @@ class MonitoringService:
             driver_id (int): ID of the driver to monitor
             
         Raises:
-            ValueError: If driver not found
+            ValidationError: If driver not found
         """
-        driver = Driver.query.get(driver_id)
-        if not driver:
-            raise ValueError(f"Autista con ID {driver_id} non trovato")
-        
-        # Update driver status
-        driver.update_monitoring_status(MonitoringStatus.MONITORING)
-        db.session.commit()
+        # Update driver status (one UPDATE; rowcount tells whether the driver exists)
+        if not DriverService.set_monitoring_status(driver_id, MonitoringStatus.MONITORING):
+            raise ValidationError(f"Autista con ID {driver_id} non trovato")
     
     @staticmethod
     def stop_monitoring_session(driver_id: int):
@@ -556,12 +1168,8 @@ class MonitoringService:
             driver_id (int): ID of the driver
             
         Raises:
-            ValueError: If driver not found
+            ValidationError: If driver not found
         """
-        driver = Driver.query.get(driver_id)
-        if not driver:
-            raise ValueError(f"Autista con ID {driver_id} non trovato")
-        
-        # Update driver status
-        driver.update_monitoring_status(MonitoringStatus.ONLINE)
-        db.session.commit()
\ No newline at end of file
+        # Update driver status (one UPDATE; rowcount tells whether the driver exists)
+        if not DriverService.set_monitoring_status(driver_id, MonitoringStatus.ONLINE):
+            raise ValidationError(f"Autista con ID {driver_id} non trovato")
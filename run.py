@@ -2,7 +2,8 @@
 Application Entry Point
 
 This script serves as the entry point for the Driver Management System Flask application.
-It creates the Flask app instance and runs the development server.
+It creates the Flask app instance and runs the development server, or a
+production WSGI server (gunicorn, waitress) when debug mode is off.
 
 Usage:
     python run.py
@@ -12,11 +13,52 @@ Date: 2024
 """
 
 import os
+import shutil
+import sys
 from app import create_app
 
 # Create the Flask application instance
 app = create_app()
 
+
+def run_production_server(server, host, port, workers, threads):
+    """
+    Serve the app with a production WSGI server instead of the Werkzeug dev server.
+    
+    'gunicorn' replaces this process with gunicorn (gthread workers, loading
+    wsgi:app); 'waitress' serves in-process (pure Python, also on Windows).
+    'auto' picks gunicorn where available, then waitress.
+    
+    Args:
+        server (str): 'auto', 'gunicorn' or 'waitress'
+        host (str): Interface to bind
+        port (int): Port to bind
+        workers (int): Gunicorn worker processes
+        threads (int): Threads per worker (gunicorn) or of the waitress pool
+        
+    Returns:
+        bool: False if the requested server is not installed (nothing was started)
+    """
+    if server in ('auto', 'gunicorn') and sys.platform != 'win32' and shutil.which('gunicorn'):
+        os.execvp('gunicorn', [
+            'gunicorn', '-k', 'gthread',
+            '-w', str(workers), '--threads', str(threads),
+            '-b', f'{host}:{port}',
+            '--chdir', os.path.dirname(os.path.abspath(__file__)),
+            'wsgi:app'
+        ])
+    
+    if server in ('auto', 'waitress'):
+        try:
+            from waitress import serve
+        except ImportError:
+            return False
+        serve(app, host=host, port=port, threads=threads)
+        return True
+    
+    return False
+
+
 if __name__ == '__main__':
     """
     Run the Flask development server.
@@ -31,6 +73,10 @@ if __name__ == '__main__':
     debug = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
     use_reloader = os.environ.get('FLASK_USE_RELOADER', '1') == '1'
     threaded = os.environ.get('FLASK_THREADED', '1') == '1'
+    # Production server used when debug is off: auto (gunicorn, then waitress), gunicorn, waitress or werkzeug
+    wsgi_server = os.environ.get('WSGI_SERVER', 'auto').lower()
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    wsgi_threads = int(os.environ.get('WSGI_THREADS', 4))
     
     print("=" * 60)
     print("🚗 Driver Management System - Starting Server")
@@ -47,12 +93,21 @@ if __name__ == '__main__':
     print("   • Drivers Page: /drivers")
     print("   • Monitor Page: /monitor/<driver_id>")
     print("   • API Health: /api/health")
+    print("   • Model Readiness: /healthz")
     print("=" * 60)
     print("📝 Environment Variables:")
     print(f"   • FLASK_USE_RELOADER: {use_reloader} (0/1)")
     print(f"   • FLASK_THREADED: {threaded} (0/1)")
+    print(f"   • WSGI_SERVER: {wsgi_server} (auto/gunicorn/waitress/werkzeug, used when debug is off)")
+    print(f"   • WEB_CONCURRENCY / WSGI_THREADS: {workers} / {wsgi_threads}")
     print("=" * 60)
     
+    # Outside debug, prefer a production WSGI server when one is installed
+    if not debug and wsgi_server != 'werkzeug':
+        if run_production_server(wsgi_server, host, port, workers, wsgi_threads):
+            sys.exit(0)
+        print(f"⚠️  WSGI server '{wsgi_server}' not available, falling back to the development server")
+    
     # Run the development server
     app.run(
         host=host,
@@ -0,0 +1,61 @@
+"""
+Import-time guarantees of the emotion detection module.
+
+TensorFlow is imported lazily, when the model is loaded: importing
+app.ai.emotion_detector (done by every frame request and by the app
+factory for the preload) must not pull in tensorflow or keras.
+
+Run with: python -m unittest discover tests
+"""
+
+import ast
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+MODULE_PATH = Path(__file__).resolve().parent.parent / 'app' / 'ai' / 'emotion_detector.py'
+HEAVY_MODULES = ('tensorflow', 'keras')
+
+
+def _is_heavy(module_name):
+    return module_name.split('.')[0] in HEAVY_MODULES
+
+
+class EmotionDetectorImportTest(unittest.TestCase):
+
+    def test_no_module_level_tensorflow_import(self):
+        """Only function bodies may import tensorflow/keras (AST check, no imports executed)."""
+        tree = ast.parse(MODULE_PATH.read_text(encoding='utf-8'))
+        offending = []
+        # Statements run at import: module level, if/try blocks and class bodies
+        pending = list(tree.body)
+        while pending:
+            node = pending.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                continue
+            if isinstance(node, ast.Import):
+                offending += [alias.name for alias in node.names if _is_heavy(alias.name)]
+            elif isinstance(node, ast.ImportFrom) and node.module and _is_heavy(node.module):
+                offending.append(node.module)
+            pending.extend(ast.iter_child_nodes(node))
+        self.assertEqual(offending, [], f"Module-level imports of {offending} in {MODULE_PATH.name}")
+
+    def test_import_does_not_load_tensorflow(self):
+        """Importing the module in a fresh interpreter leaves tensorflow/keras out of sys.modules."""
+        code = (
+            "import sys\n"
+            "import app.ai.emotion_detector\n"
+            f"loaded = sorted(m for m in sys.modules if m.split('.')[0] in {HEAVY_MODULES!r})\n"
+            "print(','.join(loaded))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=MODULE_PATH.parents[2],
+                                capture_output=True, text=True)
+        if result.returncode != 0 and 'ModuleNotFoundError' in result.stderr:
+            self.skipTest(f"emotion detector dependencies not installed: {result.stderr.strip().splitlines()[-1]}")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
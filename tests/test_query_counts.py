@@ -0,0 +1,89 @@
+"""
+Upper bounds on the SQL statements issued by the JSON API endpoints.
+
+The driver relationships are lazy and to_dict() walks them, the classic
+N+1 shape: these tests fail when an endpoint starts issuing queries per
+driver (e.g. a serializer touching driver.monitoring_sessions) instead of
+the fixed number of statements it needs today. Queries are counted with
+app.utils.count_queries on an in-memory SQLite database.
+
+Run with: python -m unittest discover tests
+"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from app import create_app, db
+    from app.config import Config
+    from app.models import Driver
+    from app.utils import count_queries
+except ImportError as e:  # Flask/SQLAlchemy stack not installed
+    raise unittest.SkipTest(f"application dependencies not installed: {e}")
+
+# Drivers added on top of the three sample ones: enough for an N+1 to break any bound below
+EXTRA_DRIVERS = 20
+
+
+class QueryCountTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.upload_dir = tempfile.mkdtemp()
+        cls.config_patch = mock.patch.multiple(
+            Config,
+            SQLALCHEMY_DATABASE_URI='sqlite://',
+            UPLOAD_FOLDER=cls.upload_dir,
+            SIMULATION_PROCESS_ASYNC=False,
+            EMOTION_PRELOAD_MODEL=False,
+        )
+        cls.config_patch.start()
+        cls.app = create_app()
+        with cls.app.app_context():
+            db.session.add_all(Driver(f'Autista{i}', 'Test', simulation_file=f'sim_{i}.csv')
+                               for i in range(EXTRA_DRIVERS))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.config_patch.stop()
+        shutil.rmtree(cls.upload_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+
+    def assertMaxQueries(self, method, url, max_queries):
+        with count_queries(db.engine) as queries:
+            response = self.client.open(url, method=method)
+        self.assertLess(response.status_code, 400, response.get_data(as_text=True))
+        self.assertLessEqual(len(queries), max_queries,
+                             f"{method} {url} issued {len(queries)} queries:\n" + "\n".join(queries))
+
+    def test_drivers_list(self):
+        self.assertMaxQueries('GET', '/api/drivers', 2)
+
+    def test_drivers_list_with_includes(self):
+        # One selectinload per included collection
+        self.assertMaxQueries('GET', '/api/drivers?include=classification,monitoring', 4)
+
+    def test_drivers_page(self):
+        self.assertMaxQueries('GET', '/api/drivers?limit=10', 1)
+
+    def test_driver_detail(self):
+        self.assertMaxQueries('GET', '/api/drivers/1', 1)
+
+    def test_classify_driver(self):
+        # One SELECT (driver and data points), one UPDATE, one INSERT
+        self.assertMaxQueries('GET', '/api/drivers/2/classify', 3)
+
+    def test_monitor_data(self):
+        self.assertMaxQueries('GET', '/api/drivers/3/monitor/data', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+"""
+WSGI Entry Point
+
+Exposes the application object for production WSGI servers, without the
+development-server startup code of run.py.
+
+Usage:
+    gunicorn -k gthread -w 2 --threads 4 -b 0.0.0.0:5000 wsgi:app
+    waitress-serve --port=5000 --threads=4 wsgi:app
+
+Author: Schumi Development Team
+Date: 2025
+"""
+
+from app import create_app
+
+# Create the Flask application instance
+app = create_app()